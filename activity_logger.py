@@ -1,16 +1,40 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, font as tkfont
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 import time
 import json
+import csv
 import os
 import platform
+import sys
 import threading
 import queue
+import asyncio
+import socket
 import webbrowser
+import heapq
+import re
+import sqlite3
+import shutil
+import subprocess
+import tempfile
+import uuid
+import hashlib
+import hmac
+import secrets
+import random
+import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
-from collections import defaultdict
+from collections import defaultdict, namedtuple, deque
 
 # --- Dependency Checks & Conditional Imports ---
+try:
+    import fcntl # Log ownership lock
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
 try:
     from PIL import Image, ImageTk
     PIL_ENABLED = True
@@ -49,6 +73,19 @@ try:
 except ImportError:
     TRAY_ENABLED = False
     
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_ENABLED = True
+except ImportError:
+    PARQUET_ENABLED = False
+
 # --- NEW: Calendar and Google API Imports ---
 try:
     from tkcalendar import Calendar
@@ -74,13 +111,22 @@ SCOPES = ['https://www.googleapis.com/auth/drive.file', 'https://www.googleapis.
 CREDENTIALS_FILE = 'credentials.json'
 
 
+# --- NEW: Clock used by the collector (the replay harness swaps in a virtual one) ---
+class SystemClock:
+    def time(self): return time.time()
+    def now(self): return datetime.now()
+    def sleep(self, seconds): time.sleep(seconds)
+    async def wait(self, seconds): await asyncio.sleep(seconds)
+
+clock = SystemClock()
+
 # --- Global variables & Listener Functions ---
 event_queue = queue.Queue()
-last_activity_time = time.time()
+last_activity_time = clock.time()
 
 def on_activity(*args):
     global last_activity_time
-    last_activity_time = time.time()
+    last_activity_time = clock.time()
 
 def on_click(x, y, button, pressed):
     if pressed:
@@ -94,31 +140,1759 @@ def start_listeners():
     mouse_listener.start()
     keyboard_listener.start()
 
-def get_active_window_title():
-    # ... (No changes in this function)
+def get_active_window():
+    """Returns (title, pid) of the foreground window in one probe; pid is None when it can't be found."""
     system = platform.system()
     try:
         if system == 'Windows':
-            import win32gui
-            return win32gui.GetWindowText(win32gui.GetForegroundWindow())
+            import win32gui, win32process
+            hwnd = win32gui.GetForegroundWindow()
+            return win32gui.GetWindowText(hwnd), win32process.GetWindowThreadProcessId(hwnd)[1]
         elif system == 'Linux':
             import subprocess
             root = subprocess.check_output(['xprop', '-root', '_NET_ACTIVE_WINDOW'], stderr=subprocess.DEVNULL)
             window_id = root.split()[-1]
-            window_name = subprocess.check_output(['xprop', '-id', window_id, 'WM_NAME'], stderr=subprocess.DEVNULL)
-            return window_name.decode().split('"', 1)[1].rsplit('"', 1)[0]
+            props = subprocess.check_output(['xprop', '-id', window_id, 'WM_NAME', '_NET_WM_PID'], stderr=subprocess.DEVNULL)
+            title, pid = "Could not get window title", None
+            for line in props.decode().splitlines():
+                if line.startswith('WM_NAME') and '"' in line:
+                    title = line.split('"', 1)[1].rsplit('"', 1)[0]
+                elif line.startswith('_NET_WM_PID') and '=' in line:
+                    pid = int(line.rsplit('=', 1)[1])
+            return title, pid
         elif system == 'Darwin':
             from AppKit import NSWorkspace
             active_app = NSWorkspace.sharedWorkspace().activeApplication()
-            return active_app.get('NSApplicationName', 'Unknown')
+            return active_app.get('NSApplicationName', 'Unknown'), int(active_app.get('NSApplicationProcessIdentifier'))
+        else:
+            return f"Unsupported OS: {system}", None
+    except Exception:
+        return "Could not get window title", None
+
+def get_foreground_pid():
+    """Returns the PID that owns the foreground window, or None."""
+    return get_active_window()[1]
+
+# --- NEW: Process identity of the foreground window ---
+WindowInfo = namedtuple('WindowInfo', 'title pid exe process')
+PROCESS_CACHE_SIZE = 512
+
+class ProcessIdentityCache:
+    """Resolves a PID to its (exe, process name), once per process lifetime.
+
+    Entries are keyed by PID and validated by create time when the foreground
+    PID changes, so a reused PID is never mistaken for the old process.
+    Re-probing the same foreground process is a dictionary lookup. Names are
+    interned, since the same few appear on every window event.
+    """
+    def __init__(self, max_size=PROCESS_CACHE_SIZE):
+        self.max_size = max_size
+        self.cache = {} # pid -> (create_time, exe, name)
+        self.last_pid = None
+
+    def lookup(self, pid):
+        if pid is None or not SPECS_ENABLED: return None, None
+        cached = self.cache.get(pid)
+        if cached and pid == self.last_pid: return cached[1:]
+        try:
+            proc = psutil.Process(pid)
+            create_time = proc.create_time()
+            if not (cached and cached[0] == create_time):
+                with proc.oneshot():
+                    name = proc.name()
+                    try:
+                        exe = proc.exe()
+                    except psutil.AccessDenied: # e.g. elevated processes on Windows
+                        exe = ''
+                if len(self.cache) >= self.max_size: self.cache.pop(next(iter(self.cache)))
+                cached = self.cache[pid] = (create_time, sys.intern(exe), sys.intern(name))
+        except psutil.Error:
+            self.cache.pop(pid, None)
+            return None, None
+        self.last_pid = pid
+        return cached[1:]
+
+# --- NEW: Multi-device log streams ---
+# Har device nijer stream likhe; Drive theke onno device er stream gulo ekhane rakha hoy
+LOG_FILE = os.path.expanduser('~/.activity_log.jsonl')
+DEVICE_ID_FILE = os.path.expanduser('~/.activity_logger_device')
+STREAMS_DIR = os.path.expanduser('~/.activity_logger_streams')
+DRIVE_LOG_NAME = 'activity_log.jsonl'
+GOOGLE_RECONNECT_MS = 5 * 60 * 1000 # After the worker's retries run out on a network error
+
+DEVICE_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+') # Device IDs become file names, so nothing path-like
+
+def is_valid_device_id(device_id):
+    return bool(device_id) and DEVICE_ID_PATTERN.fullmatch(device_id) is not None
+
+def get_device_id():
+    """Returns this machine's device ID, creating one on first run."""
+    if os.path.exists(DEVICE_ID_FILE):
+        with open(DEVICE_ID_FILE, 'r', encoding='utf-8') as f:
+            device_id = f.read().strip()
+        if is_valid_device_id(device_id): return device_id
+    host = ''.join(c for c in platform.node().lower() if (c.isascii() and c.isalnum()) or c == '-') or 'device'
+    device_id = f"{host}-{uuid.uuid4().hex[:8]}"
+    with open(DEVICE_ID_FILE, 'w', encoding='utf-8') as f:
+        f.write(device_id)
+    return device_id
+
+def drive_stream_name(device_id):
+    """Name of a device's log stream in the Drive backup folder."""
+    return f"activity_log.{device_id}.jsonl"
+
+def iter_log_file(path, device=None):
+    """Yields entries from a JSONL log one at a time, skipping bad lines."""
+    if not os.path.exists(path): return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(entry, dict): continue
+            if device: entry.setdefault('device', device)
+            yield entry
+
+def get_stream_sources(device_id, log_file=LOG_FILE):
+    """Returns (device, path) pairs for this device's log and every synced device stream."""
+    sources = [(device_id, log_file)]
+    if os.path.isdir(STREAMS_DIR):
+        for name in sorted(os.listdir(STREAMS_DIR)):
+            device = name[:-len('.jsonl')]
+            if name.endswith('.jsonl') and device != device_id and is_valid_device_id(device):
+                sources.append((device, os.path.join(STREAMS_DIR, name)))
+    return sources
+
+def merge_log_streams(streams):
+    """Streaming k-way merge of time-ordered entry streams, dropping duplicates.
+
+    Only the entries that share the current timestamp are remembered, so memory
+    stays constant no matter how large the streams are.
+    """
+    last_time, seen = None, set()
+    for entry in heapq.merge(*streams, key=lambda e: e.get('time', '')):
+        entry_time = entry.get('time', '')
+        if entry_time != last_time:
+            last_time, seen = entry_time, set()
+        key = (entry.get('type'), entry.get('event'))
+        if key in seen: continue
+        seen.add(key)
+        yield entry
+
+# --- NEW: Fast JSONL loader ---
+def parse_jsonl_file(path):
+    """Parses a JSONL log line by line, with orjson when it is installed.
+
+    Returns (entries, entries_per_second). Entries keep file order; blank and bad lines are skipped.
+    """
+    if not os.path.exists(path): return [], 0.0
+    started = time.perf_counter()
+    loads = orjson.loads if ORJSON_ENABLED else json.loads
+    entries = []
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip(): continue
+            try:
+                entries.append(loads(line))
+            except ValueError: # Bad JSON or bad UTF-8, same as the old skip
+                continue
+    elapsed = time.perf_counter() - started
+    return entries, (len(entries) / elapsed if elapsed > 0 else 0.0)
+
+# --- NEW: Background Drive worker ---
+RETRYABLE_NETWORK_ERRORS = (ConnectionError, TimeoutError, socket.timeout)
+
+def is_retryable_error(error):
+    """Rate limits, server errors and dropped connections are retried; anything else fails at once."""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is not None: return int(status) == 429 or int(status) >= 500
+    if isinstance(error, RETRYABLE_NETWORK_ERRORS): return True
+    # httplib2 and google-auth network failures, matched by name so neither is imported here
+    return type(error).__name__ in ('ServerNotFoundError', 'TransportError')
+
+class DriveWorker:
+    """Runs Google API calls on a single background thread with exponential backoff.
+
+    Completion callbacks are put on `results` as ('callback', (callback, value))
+    and run by the Tk thread's process_queue, so UI code never waits on the
+    network and no Tk call is made from the worker.
+    """
+    def __init__(self, results, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.results = results
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cancelled = threading.Event()
+        # One worker keeps Drive calls ordered and the (non thread-safe) service on one thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drive-worker")
+
+    def submit(self, func, *args, on_success=None, on_error=None, retries=None):
+        if self.cancelled.is_set(): return None
+        retries = self.max_retries if retries is None else retries
+        return self.executor.submit(self._run, func, args, on_success, on_error, retries)
+
+    def _run(self, func, args, on_success, on_error, retries):
+        attempt = 0
+        while True:
+            try:
+                result = func(*args)
+                break
+            except Exception as e:
+                if attempt >= retries or not is_retryable_error(e) or self.cancelled.is_set():
+                    if on_error: self._callback(on_error, e)
+                    return
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                print(f"Drive call failed ({e}), retrying in {delay:.1f}s")
+                if self.cancelled.wait(delay): return
+        if on_success: self._callback(on_success, result)
+
+    def _callback(self, callback, value):
+        if self.cancelled.is_set(): return
+        self.results.put(('callback', (callback, value)))
+
+    def shutdown(self):
+        self.cancelled.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# --- NEW: Change-driven render scheduler ---
+class RenderScheduler:
+    """One redraw loop per page.
+
+    Every frame computes a cheap snapshot key and only calls render() when it
+    differs from the last drawn one. invalidate() bursts collapse into a single
+    frame, and nothing runs while paused (window hidden to the tray).
+    """
+    def __init__(self, root, snapshot, render, interval_ms=None, coalesce_ms=50):
+        self.root = root
+        self.snapshot = snapshot
+        self.render = render
+        self.interval_ms = interval_ms # None = only redraw on invalidate()
+        self.coalesce_ms = coalesce_ms
+        self.started = False
+        self.paused = False
+        self.after_id = None
+        self.due = None
+        self.last_key = object()
+
+    def start(self):
+        if self.started: return
+        self.started = True
+        self.invalidate()
+
+    def invalidate(self):
+        """Requests a frame soon; repeated calls before it runs are merged."""
+        if self.started and not self.paused:
+            self._schedule(self.coalesce_ms)
+
+    def pause(self):
+        self.paused = True
+        if self.after_id:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def resume(self):
+        if not self.paused: return
+        self.paused = False
+        self.invalidate()
+
+    def _schedule(self, delay_ms):
+        due = time.monotonic() + delay_ms / 1000
+        if self.after_id:
+            if self.due <= due: return # An earlier frame is already queued
+            self.root.after_cancel(self.after_id)
+        self.due = due
+        self.after_id = self.root.after(delay_ms, self._frame)
+
+    def _frame(self):
+        self.after_id = None
+        if self.paused: return
+        key = self.snapshot()
+        if key != self.last_key:
+            self.last_key = key
+            self.render()
+        if self.interval_ms:
+            self._schedule(self.interval_ms)
+
+# --- NEW: Title to application classification ---
+RULES_FILE = os.path.expanduser('~/.activity_logger_rules.json')
+# User rules (RULES_FILE) are checked first, in order. Format:
+# [{"pattern": "jira", "app": "Jira", "category": "Planning"}, ...]
+# A rule can also match the window's process name with "process": "regex".
+DEFAULT_APP_RULES = [
+    {'pattern': r'visual studio code|\bvs ?code\b', 'process': r'^code', 'app': 'Visual Studio Code', 'category': 'Development'},
+    {'pattern': r'pycharm|intellij|android studio', 'process': r'pycharm|idea|studio', 'app': 'JetBrains IDE', 'category': 'Development'},
+    {'pattern': r'google chrome|chromium', 'process': r'^chrome|chromium', 'app': 'Google Chrome', 'category': 'Browsing'},
+    {'pattern': r'mozilla firefox', 'process': r'^firefox', 'app': 'Firefox', 'category': 'Browsing'},
+    {'pattern': r'microsoft.? edge', 'process': r'^msedge', 'app': 'Microsoft Edge', 'category': 'Browsing'},
+    {'pattern': r'\bslack\b', 'process': r'^slack', 'app': 'Slack', 'category': 'Communication'},
+    {'pattern': r'microsoft teams|\bzoom\b', 'process': r'teams|^zoom', 'app': 'Meetings', 'category': 'Communication'},
+    {'pattern': r'\boutlook\b|thunderbird|gmail', 'process': r'^outlook|thunderbird', 'app': 'Email', 'category': 'Communication'},
+    {'pattern': r'\bword\b|\bexcel\b|powerpoint|libreoffice', 'process': r'^(winword|excel|powerpnt|soffice)', 'app': 'Office', 'category': 'Documents'},
+    {'pattern': r'command prompt|powershell|terminal|\bbash\b', 'process': r'^(cmd|powershell|pwsh|windowsterminal)\.exe$|terminal|konsole|xterm', 'app': 'Terminal', 'category': 'Development'},
+    {'pattern': r'file explorer|^finder$', 'process': r'^explorer\.exe$|^finder$|nautilus|dolphin', 'app': 'File Manager', 'category': 'System'},
+]
+TITLE_SEPARATORS = re.compile(r' [-\u2013\u2014|] ')
+
+class AppClassifier:
+    """Maps raw window titles (and process names, when known) to canonical (app, category) names.
+
+    All rule patterns are compiled into one regex; each rule is a lookahead
+    anchored at the start, so the first matching rule wins in list order.
+    Process patterns get a second regex built the same way; a rule applies
+    if either matches. Results are memoized in a bounded LRU cache.
+    """
+    def __init__(self, rules_file=RULES_FILE, cache_size=4096):
+        self.rules_file = rules_file
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+        self.generation = 0
+        self.load_rules()
+
+    def load_rules(self):
+        user_rules = []
+        if os.path.exists(self.rules_file):
+            try:
+                with open(self.rules_file, 'r', encoding='utf-8') as f:
+                    user_rules = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read rules from {self.rules_file}: {e}")
+            if not isinstance(user_rules, list):
+                print(f"Ignoring {self.rules_file}: expected a list of rules")
+                user_rules = []
+        self.rules, self.matcher, self.process_matcher = self.compile_rules(user_rules + DEFAULT_APP_RULES)
+        self.categories = {rule['app']: rule.get('category', 'Other') for rule in reversed(self.rules)}
+        self.classify.cache_clear()
+        self.generation += 1
+
+    @staticmethod
+    def compile_rules(rules):
+        """Returns (valid rules, title matcher, process matcher); invalid rules are skipped with a message."""
+        valid, fragments, names = [], [], set()
+        for rule in rules:
+            try:
+                if not isinstance(rule, dict) or not isinstance(rule.get('app'), str) or not rule['app']:
+                    raise ValueError("a rule needs an 'app' name")
+                rule_fragments = {}
+                for key in ('pattern', 'process'):
+                    if key == 'process' and key not in rule: continue
+                    if not isinstance(rule.get(key), str): raise ValueError(f"'{key}' must be a string")
+                    re.compile(rule[key])
+                    # Checked as it will be combined: global flags like (?i) are only valid at the very start
+                    rule_fragments[key] = f"(?P<r{len(valid)}>(?=.*?(?:{rule[key]})))"
+                    groups = set(re.compile(rule_fragments[key]).groupindex) - {f"r{len(valid)}"}
+                    taken = {name for name in groups if name in names or re.fullmatch(r'r\d+', name)}
+                    if taken: raise ValueError(f"group name {sorted(taken)[0]!r} is already used")
+                    names |= groups
+            except (ValueError, re.error) as e:
+                print(f"Skipping invalid rule {rule!r}: {e}")
+                continue
+            names.add(f"r{len(valid)}")
+            fragments.append(rule_fragments)
+            valid.append(rule)
+
+        def combine(count):
+            patterns = [f['pattern'] for f in fragments[:count]]
+            process_patterns = [f['process'] for f in fragments[:count] if 'process' in f]
+            return (re.compile('|'.join(patterns), re.IGNORECASE | re.DOTALL) if patterns else None,
+                    re.compile('|'.join(process_patterns), re.IGNORECASE | re.DOTALL) if process_patterns else None)
+        try:
+            return (valid,) + combine(len(valid))
+        except re.error:
+            pass
+        # Some rule only fails in combination: drop the first one that breaks the list and try again
+        for count in range(1, len(valid) + 1):
+            try:
+                combine(count)
+            except re.error:
+                break
+        print(f"Skipping invalid rule {valid[count - 1]!r}: it does not combine with the rules before it")
+        return AppClassifier.compile_rules(valid[:count - 1] + valid[count:])
+
+    def _classify(self, title, process=None):
+        if not title and not process: return 'Unknown', 'Other'
+        matched = []
+        for matcher, text in ((self.matcher, title), (self.process_matcher, process)):
+            match = matcher.match(text) if matcher and text else None
+            if match: matched.append(int(match.lastgroup[1:]))
+        if matched:
+            rule = self.rules[min(matched)]
+            return rule['app'], rule.get('category', 'Other')
+        if process: # The process is exact where the title is only a guess
+            return re.sub(r'\.exe$', '', process, flags=re.IGNORECASE) or process, 'Other'
+        # "document - Application" style titles: the application is the last part
+        return TITLE_SEPARATORS.split(title)[-1].strip() or title, 'Other'
+
+    def category_of(self, app):
+        return self.categories.get(app, 'Other')
+
+# --- NEW: Unified sessionization engine ---
+# Dashboard, Reports ar Logs shob ekhon ei engine er session theke hisab kore
+SESSION_GAP_SECONDS = 1800 # Longer gaps between events are not counted as active or idle
+SESSIONS_FILE = os.path.expanduser('~/.activity_sessions.jsonl')
+SESSIONS_CHECKPOINT_FILE = os.path.expanduser('~/.activity_sessions.checkpoint.json')
+SESSIONS_SAVE_INTERVAL = 30 # seconds
+
+Session = namedtuple('Session', 'device title state start end seconds process', defaults=(None,))
+
+class SessionEngine:
+    """Turns the event stream into typed (app, active/idle, start, end) sessions exactly once.
+
+    Events are consumed incrementally and per device. A session ends on an
+    app or idle/active change, a gap of SESSION_GAP_SECONDS, or midnight.
+    Closed sessions and the open state are checkpointed to disk, so a restart
+    only replays the events logged since the last save.
+    """
+    def __init__(self, classifier, sessions_file=SESSIONS_FILE, checkpoint_file=SESSIONS_CHECKPOINT_FILE):
+        self.classifier = classifier # Sessions keep raw titles; app totals are grouped by canonical app
+        self.sessions_file = sessions_file
+        self.checkpoint_file = checkpoint_file
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self.by_day = defaultdict(list)
+        self.totals = defaultdict(lambda: {'active': 0.0, 'idle': 0.0}) # (day, device) -> seconds
+        self.apps = defaultdict(lambda: defaultdict(float)) # (day, device) -> canonical app -> active seconds
+        self.devices = set()
+        self.open = {} # device -> current (not yet closed) session state
+        self.processed = defaultdict(int) # device -> entries of its stream consumed so far
+        self.last_entries = {} # device -> last entry consumed from its stream
+        self.count = 0
+        self.unsaved = []
+        self.rewrite = False
+        self.last_save = 0
+
+    # --- Ingestion ---
+    def feed(self, entry):
+        with self.lock:
+            stream = self._device_of(entry)
+            self.processed[stream] += 1
+            self.last_entries[stream] = entry
+            try:
+                current_time = datetime.fromisoformat(entry['time'])
+            except (KeyError, TypeError, ValueError):
+                return
+            device = entry.get('device')
+            if entry.get('type') == 'rollup':
+                self._feed_rollup(device, entry)
+                return
+            state = self.open.get(device)
+            if state is None:
+                state = self.open[device] = {'start': current_time, 'time': current_time, 'idle': False, 'title': None, 'process': None}
+                self.devices.add(device)
+            else:
+                gap = (current_time - state['time']).total_seconds()
+                if gap >= SESSION_GAP_SECONDS or gap < 0:
+                    self._close(device, state, state['time'])
+                    state['start'] = current_time
+                elif current_time.date() != state['start'].date():
+                    midnight = datetime.combine(current_time.date(), datetime.min.time(), current_time.tzinfo)
+                    self._close(device, state, midnight)
+                    state['start'] = midnight
+
+            idle, title, process = state['idle'], state['title'], state['process']
+            event = entry.get('event', '')
+            if entry.get('type') == 'activity':
+                if 'User is Idle' in event: idle = True
+                elif 'User is Active' in event: idle = False
+            elif entry.get('type') == 'window' and event.startswith("Switched to: "):
+                title = event[len("Switched to: "):]
+                process = entry.get('process')
+                if process: process = sys.intern(process)
+            if (idle, title, process) != (state['idle'], state['title'], state['process']):
+                self._close(device, state, current_time)
+                state['start'] = current_time
+                state['idle'], state['title'], state['process'] = idle, title, process
+            state['time'] = current_time
+
+    def _feed_rollup(self, device, entry):
+        """Compacted history: the session is stored whole and its state carries on after it."""
+        try:
+            end = datetime.fromisoformat(entry['end'])
+            session = Session(device, entry.get('title'), entry.get('state', 'active'), entry['time'], entry['end'],
+                              float(entry['seconds']), entry.get('process'))
+        except (KeyError, TypeError, ValueError):
+            return
+        state = self.open.get(device)
+        if state is not None: self._close(device, state, state['time'])
+        self._add(session)
+        self.unsaved.append(session)
+        self.open[device] = {'start': end, 'time': end, 'idle': session.state == 'idle', 'title': session.title, 'process': session.process}
+
+    def _close(self, device, state, end):
+        seconds = (end - state['start']).total_seconds()
+        if seconds <= 0: return
+        session = Session(device, state['title'], 'idle' if state['idle'] else 'active',
+                          state['start'].isoformat(), end.isoformat(), seconds, state['process'])
+        self._add(session)
+        self.unsaved.append(session)
+
+    def _add(self, session):
+        day = session.start[:10]
+        self.by_day[day].append(session)
+        self.totals[(day, session.device)][session.state] += session.seconds
+        if session.state == 'active' and (session.title or session.process):
+            app, _ = self.classifier.classify(session.title, session.process)
+            self.apps[(day, session.device)][app] += session.seconds
+        self.devices.add(session.device)
+        self.count += 1
+
+    # --- Queries (open sessions are included up to their last event) ---
+    def _open_sessions(self, day):
+        for device, state in self.open.items():
+            seconds = (state['time'] - state['start']).total_seconds()
+            if seconds > 0 and state['start'].date().isoformat() == day:
+                yield Session(device, state['title'], 'idle' if state['idle'] else 'active',
+                              state['start'].isoformat(), state['time'].isoformat(), seconds, state['process'])
+
+    def sessions_for_day(self, day, device=None):
+        with self.lock:
+            sessions = self.by_day.get(day, []) + list(self._open_sessions(day))
+        return [s for s in sessions if device is None or s.device == device]
+
+    def day_totals(self, day, device=None):
+        """Returns (active_seconds, idle_seconds) for a day."""
+        with self.lock:
+            active = idle = 0.0
+            for dev in self.devices:
+                if device is not None and dev != device: continue
+                totals = self.totals.get((day, dev))
+                if totals:
+                    active += totals['active']
+                    idle += totals['idle']
+            for session in self._open_sessions(day):
+                if device is not None and session.device != device: continue
+                if session.state == 'idle': idle += session.seconds
+                else: active += session.seconds
+        return active, idle
+
+    def app_totals(self, day, device=None):
+        """Returns {app: active_seconds} for a day."""
+        usage = defaultdict(float)
+        with self.lock:
+            for dev in self.devices:
+                if device is not None and dev != device: continue
+                for app, seconds in self.apps.get((day, dev), {}).items():
+                    usage[app] += seconds
+            for session in self._open_sessions(day):
+                if (device is None or session.device == device) and session.state == 'active' and (session.title or session.process):
+                    usage[self.classifier.classify(session.title, session.process)[0]] += session.seconds
+        return usage
+
+    def category_totals(self, day, device=None):
+        """Returns {category: active_seconds} for a day."""
+        usage = defaultdict(float)
+        for app, seconds in self.app_totals(day, device).items():
+            usage[self.classifier.category_of(app)] += seconds
+        return usage
+
+    def reclassify(self):
+        """Regroups every stored session's app totals after the rules changed."""
+        with self.lock:
+            self.apps.clear()
+            for sessions in self.by_day.values():
+                for session in sessions:
+                    if session.state == 'active' and (session.title or session.process):
+                        app, _ = self.classifier.classify(session.title, session.process)
+                        self.apps[(session.start[:10], session.device)][app] += session.seconds
+
+    # --- Persistence ---
+    @staticmethod
+    def _device_of(entry):
+        return entry.get('device') if isinstance(entry, dict) else None
+
+    @staticmethod
+    def _fingerprint(entry):
+        if not isinstance(entry, dict): return None
+        return [entry.get('time'), entry.get('device'), entry.get('event')]
+
+    def load(self, data):
+        """Resumes each device's stream from the checkpoint where it still matches data.
+
+        The checkpoint keeps an offset and fingerprint per device stream, so
+        syncing in another device's events never invalidates the local one.
+        Only devices whose stream changed underneath it are rebuilt.
+        """
+        with self.lock:
+            self.reset()
+            checkpoint = None
+            if os.path.exists(self.checkpoint_file):
+                try:
+                    with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                        checkpoint = json.load(f)
+                except (OSError, ValueError):
+                    checkpoint = None
+            streams = defaultdict(list)
+            for entry in data:
+                streams[self._device_of(entry)].append(entry)
+
+            resumed = {}
+            try:
+                restored = isinstance(checkpoint, dict) and 'streams' in checkpoint and self._restore(checkpoint)
+                if restored:
+                    for device, processed, fingerprint in checkpoint['streams']:
+                        entries = streams.get(device, [])
+                        if 0 < processed <= len(entries) and self._fingerprint(entries[processed - 1]) == fingerprint:
+                            resumed[device] = processed
+            except (ValueError, TypeError):
+                restored = False # A damaged checkpoint only costs a rebuild
+            if restored:
+                stale = (self.devices | set(self.open)) - resumed.keys()
+                if stale: self._drop_devices(stale)
+            else:
+                resumed = {}
+                self.reset()
+                self.rewrite = True
+
+            for device, entries in streams.items():
+                start = resumed.get(device, 0)
+                if start:
+                    self.processed[device] = start
+                    self.last_entries[device] = entries[start - 1]
+                for entry in entries[start:]:
+                    self.feed(entry)
+            self.save()
+
+    def _drop_devices(self, devices):
+        """Forgets everything derived from these devices' streams, so they can be fed again."""
+        for day in list(self.by_day):
+            self.by_day[day] = [session for session in self.by_day[day] if session.device not in devices]
+            if not self.by_day[day]: del self.by_day[day]
+        for key in [key for key in self.totals if key[1] in devices]: del self.totals[key]
+        for key in [key for key in self.apps if key[1] in devices]: del self.apps[key]
+        for device in devices: self.open.pop(device, None)
+        self.devices -= devices
+        self.count = sum(len(sessions) for sessions in self.by_day.values())
+        self.rewrite = True
+
+    def _restore(self, checkpoint):
+        if not os.path.exists(self.sessions_file): return False
+        wanted = checkpoint.get('sessions', 0)
+        try:
+            with open(self.sessions_file, 'r+b') as f:
+                while self.count < wanted:
+                    line = f.readline()
+                    if not line: return False
+                    # Sessions are appended without fsync, so a crash can leave the last line cut short
+                    self._add(Session(*json.loads(line)))
+                f.truncate(f.tell()) # Drop sessions written after the checkpoint
+            for device, start, last_time, idle, title, *process in checkpoint.get('open', []):
+                self.open[device] = {'start': datetime.fromisoformat(start), 'time': datetime.fromisoformat(last_time),
+                                     'idle': idle, 'title': title, 'process': process[0] if process else None}
+                self.devices.add(device)
+        except (ValueError, TypeError):
+            return False
+        return True
+
+    def save(self):
+        """Appends closed sessions and writes the checkpoint that matches them."""
+        with self.lock:
+            mode = 'w' if self.rewrite else 'a'
+            sessions = [session for day in sorted(self.by_day) for session in self.by_day[day]] if self.rewrite else self.unsaved
+            with open(self.sessions_file, mode, encoding='utf-8') as f:
+                f.writelines(json.dumps(list(session)) + '\n' for session in sessions)
+            self.unsaved, self.rewrite = [], False
+
+            checkpoint = {
+                'sessions': self.count,
+                'streams': [[device, processed, self._fingerprint(self.last_entries.get(device))]
+                            for device, processed in self.processed.items()],
+                'open': [[device, state['start'].isoformat(), state['time'].isoformat(), state['idle'], state['title'], state['process']]
+                         for device, state in self.open.items()],
+            }
+            tmp_file = self.checkpoint_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_file, self.checkpoint_file)
+            self.last_save = time.monotonic()
+
+    def maybe_save(self):
+        if self.unsaved and time.monotonic() - self.last_save > SESSIONS_SAVE_INTERVAL:
+            self.save()
+
+# --- NEW: Tiered retention ---
+# Purono raw event gulo session rollup e compact kora hoy, din er total thik thake
+RETENTION_STATE_FILE = os.path.expanduser('~/.activity_retention.json')
+ROLLUP_TOP_TITLES = 20 # Titles outside a day's top N are stored as their app name
+RETENTION_CHECK_INTERVAL_MS = 6 * 60 * 60 * 1000
+
+def copy_bytes(src, dst, count, chunk_size=1024 * 1024):
+    """Copies exactly count bytes (or up to EOF) from src to dst."""
+    while count > 0:
+        chunk = src.read(min(chunk_size, count))
+        if not chunk: break
+        dst.write(chunk)
+        count -= len(chunk)
+
+def rollup_entries(sessions, classifier):
+    """Turns one day's sessions into rollup entries, keeping only its top window titles."""
+    title_seconds = defaultdict(float)
+    for session in sessions:
+        if session.title: title_seconds[session.title] += session.seconds
+    top_titles = set(sorted(title_seconds, key=title_seconds.get, reverse=True)[:ROLLUP_TOP_TITLES])
+    
+    rollups = []
+    for session in sessions:
+        title = session.title if not session.title or session.title in top_titles else classifier.classify(session.title, session.process)[0]
+        last = rollups[-1] if rollups else None
+        # Neighbouring sessions that now look the same are merged (totals stay exact)
+        if last and last['end'] == session.start and (last['device'], last['title'], last['state'], last.get('process')) == (session.device, title, session.state, session.process):
+            last['end'] = session.end
+            last['seconds'] += session.seconds
+            continue
+        rollups.append({'time': session.start, 'type': 'rollup', 'event': f"Rollup: {title or 'No window'}",
+                        'device': session.device, 'title': title, 'state': session.state,
+                        'end': session.end, 'seconds': session.seconds})
+        if session.process: rollups[-1]['process'] = session.process
+    return rollups
+
+def compact_log_file(path, keep_days, classifier, lock, device_id=None, state_file=RETENTION_STATE_FILE):
+    """Replaces raw events older than keep_days in a log with per-session rollups.
+
+    Only the raw part of the file (after the last rollup) is read. Per-day
+    active/idle totals are preserved exactly. The lock (held by log writers)
+    is only taken to copy the lines appended while compacting and swap the
+    file in. Returns the number of days compacted.
+    """
+    if not os.path.exists(path): return 0
+    cutoff = (date.today() - timedelta(days=max(1, keep_days))).isoformat()
+    state = {}
+    if os.path.exists(state_file):
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+    with lock:
+        size = os.path.getsize(path)
+    raw_offset = state.get('raw_offset', 0) if state.get('path') == path and state.get('raw_offset', 0) <= size else 0
+    last_rollup = state.get('last_rollup') if raw_offset else None
+
+    # Fast path: nothing to do while the oldest raw event is still recent
+    with open(path, 'rb') as f:
+        f.seek(raw_offset)
+        first = f.readline()
+    try:
+        first_entry = json.loads(first)
+        if first_entry.get('type') != 'rollup' and first_entry.get('time', '') >= cutoff: return 0
+    except (ValueError, AttributeError):
+        if not first: return 0
+
+    engine = SessionEngine(classifier, sessions_file=None, checkpoint_file=None) # In-memory only
+    if last_rollup:
+        engine.feed(last_rollup)
+        engine.unsaved = [] # Already written
+    tmp_file = path + '.compact'
+    days, day_sessions, day = 0, [], None
+    with open(path, 'rb') as src, open(tmp_file, 'wb') as dst:
+        copy_bytes(src, dst, raw_offset) # Already compacted rollups
+
+        def write_day():
+            nonlocal days, last_rollup
+            rollups = rollup_entries(day_sessions, classifier)
+            for rollup in rollups: dst.write((json.dumps(rollup) + '\n').encode('utf-8'))
+            if rollups: last_rollup = rollups[-1]
+            days += 1
+
+        def drain():
+            nonlocal day, day_sessions
+            for session in engine.unsaved:
+                if session.start >= cutoff: continue # Recomputed later from the raw events kept
+                if day and session.start[:10] != day:
+                    write_day()
+                    day_sessions = []
+                day = session.start[:10]
+                day_sessions.append(session)
+            engine.unsaved = []
+
+        new_raw_offset = None
+        while src.tell() < size:
+            line = src.readline()
+            try:
+                entry = json.loads(line)
+                entry_time = entry.get('time', '')
+            except (ValueError, AttributeError):
+                continue # Bad lines in the old region are dropped
+            if device_id: entry.setdefault('device', device_id)
+            engine.feed(entry) # Feeding the first recent event closes the last old session
+            if entry_time >= cutoff and entry.get('type') != 'rollup':
+                drain()
+                if day_sessions: write_day()
+                new_raw_offset = dst.tell()
+                dst.write(line)
+                copy_bytes(src, dst, size - src.tell())
+                break
+            drain()
         else:
-            return f"Unsupported OS: {system}"
+            # No recent events yet: the still-open session is rolled up as well
+            for device, open_state in list(engine.open.items()):
+                engine._close(device, open_state, open_state['time'])
+            drain()
+            if day_sessions: write_day()
+            new_raw_offset = dst.tell()
+
+        with lock:
+            # Lines logged while we were compacting
+            src.seek(size)
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+            os.replace(tmp_file, path)
+
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump({'path': path, 'raw_offset': new_raw_offset, 'last_rollup': last_rollup, 'cutoff': cutoff}, f)
+    return days
+
+# --- NEW: Per-application resource sampling ---
+RESOURCES_FILE = os.path.expanduser('~/.activity_resources.jsonl')
+SAMPLER_BASE_INTERVAL = 5 # seconds between samples while the user is active
+SAMPLER_MAX_INTERVAL = 60
+SAMPLER_CPU_BUDGET = 0.005 # The sampler may use at most 0.5% of one core
+
+class ResourceSampler:
+    """Attributes CPU% and RSS to the foreground application over time.
+
+    Each sample is one process_iter() pass. psutil reuses its cached Process
+    handles between passes, so cpu_percent() needs no extra sleep. The interval
+    doubles while the user is idle or while the sampler's own CPU time is over
+    budget. Samples are stored as compact [time, app, cpu%, rss_mb] rows.
+    """
+    def __init__(self, path=RESOURCES_FILE):
+        self.path = path
+        self.interval = SAMPLER_BASE_INTERVAL
+        self.cpu_count = psutil.cpu_count() or 1
+        self.started = time.monotonic()
+        self.own_cpu_seconds = 0.0
+        self.samples = 0
+        self.history = deque(maxlen=2000) # Recent samples for the System Info page
+        self.pending = []
+
+    def sample(self, foreground_pid):
+        """Takes one sample; returns the [time, app, cpu%, rss_mb] row or None."""
+        cpu_started = time.thread_time()
+        foreground_name = None
+        cpu_by_name, rss_by_name = defaultdict(float), defaultdict(int)
+        for proc in psutil.process_iter(['name', 'cpu_percent', 'memory_info']):
+            info = proc.info
+            name = info.get('name')
+            if not name: continue
+            if proc.pid == foreground_pid: foreground_name = name
+            cpu_by_name[name] += info.get('cpu_percent') or 0.0
+            if info.get('memory_info'): rss_by_name[name] += info['memory_info'].rss
+        row = None
+        if foreground_name:
+            # Multi-process apps (browsers, editors) are summed by process name
+            row = [datetime.now().isoformat(timespec='seconds'), sys.intern(foreground_name),
+                   round(cpu_by_name[foreground_name] / self.cpu_count, 1), round(rss_by_name[foreground_name] / (1024**2), 1)]
+            self.history.append(row)
+            self.pending.append(row)
+            if len(self.pending) >= 12: self.flush()
+        self.own_cpu_seconds += time.thread_time() - cpu_started
+        self.samples += 1
+        return row
+
+    def overhead(self):
+        """Fraction of one core spent sampling since start."""
+        elapsed = time.monotonic() - self.started
+        return self.own_cpu_seconds / elapsed if elapsed > 0 else 0.0
+
+    def next_interval(self, is_idle):
+        if is_idle or self.overhead() > SAMPLER_CPU_BUDGET:
+            self.interval = min(SAMPLER_MAX_INTERVAL, self.interval * 2)
+        else:
+            self.interval = SAMPLER_BASE_INTERVAL
+        return self.interval
+
+    def flush(self):
+        if not self.pending: return
+        rows, self.pending = self.pending, []
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+
+    def app_averages(self, day):
+        """Returns {app: (avg_cpu, avg_rss_mb, samples)} over the recent samples kept in memory that fall on day."""
+        sums = defaultdict(lambda: [0.0, 0.0, 0])
+        for sample_time, app, cpu, rss in self.history:
+            if not sample_time.startswith(day): continue
+            totals = sums[app]
+            totals[0] += cpu
+            totals[1] += rss
+            totals[2] += 1
+        return {app: (cpu / n, rss / n, n) for app, (cpu, rss, n) in sums.items()}
+
+def benchmark_sampler(samples=50):
+    """Measures the sampler's CPU cost per sample against SAMPLER_CPU_BUDGET."""
+    sampler = ResourceSampler(path=os.devnull)
+    pid = get_foreground_pid() or os.getpid()
+    sampler.sample(pid) # Primes psutil's Process cache, like the first real sample
+    sampler.own_cpu_seconds, sampler.samples = 0.0, 0
+    for _ in range(samples):
+        sampler.sample(pid)
+    per_sample = sampler.own_cpu_seconds / samples
+    overhead = per_sample / SAMPLER_BASE_INTERVAL
+    print(f"{samples} samples, {per_sample * 1000:.2f} ms CPU per sample, "
+          f"{overhead:.3%} of one core at {SAMPLER_BASE_INTERVAL}s interval (budget {SAMPLER_CPU_BUDGET:.1%})")
+    return overhead <= SAMPLER_CPU_BUDGET
+
+# --- NEW: Time-of-day heatmap ---
+HEATMAP_CACHE_FILE = os.path.expanduser('~/.activity_heatmap_cache.json')
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+HEATMAP_RANGES = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
+HEATMAP_CELL = (28, 18) # width, height in pixels
+HEATMAP_LEFT, HEATMAP_TOP = 40, 18 # Room for the weekday and hour labels
+
+def bin_sessions_by_hour(sessions):
+    """Bins one day's sessions into {'active': [24], 'idle': [24]} seconds per hour."""
+    grid = {'active': [0.0] * 24, 'idle': [0.0] * 24}
+    for session in sessions:
+        start, end = datetime.fromisoformat(session.start), datetime.fromisoformat(session.end)
+        row = grid['idle' if session.state == 'idle' else 'active']
+        # Sessions never cross midnight, so only the hours in between are touched
+        while start < end:
+            hour_end = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            chunk_end = min(end, hour_end)
+            row[start.hour] += (chunk_end - start).total_seconds()
+            start = chunk_end
+    return grid
+
+class HeatmapCache:
+    """Per-day hour grids, cached on disk so widening a range only bins the missing days.
+
+    A cached day is reused while the session engine's totals for that day are
+    unchanged; today is never cached.
+    """
+    def __init__(self, session_engine, path=HEATMAP_CACHE_FILE):
+        self.session_engine = session_engine
+        self.path = path
+        self.grids = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.grids = json.load(f)
+            except (OSError, ValueError):
+                self.grids = {}
+
+    def day_grid(self, day, device=None):
+        key = f"{day}|{device or '*'}"
+        signature = [round(seconds, 3) for seconds in self.session_engine.day_totals(day, device)]
+        cached = self.grids.get(key)
+        if cached and cached['signature'] == signature:
+            return cached
+        grid = bin_sessions_by_hour(self.session_engine.sessions_for_day(day, device))
+        grid['signature'] = signature
+        if day != date.today().isoformat():
+            self.grids[key] = grid
+            self.dirty = True
+        return grid
+
+    def weekday_hour_grid(self, start_day, end_day, state='active', device=None):
+        """Returns a 7x24 grid (Monday first) of seconds summed over the range."""
+        grid = [[0.0] * 24 for _ in range(7)]
+        day = date.fromisoformat(start_day)
+        while day <= date.fromisoformat(end_day):
+            row = grid[day.weekday()]
+            for hour, seconds in enumerate(self.day_grid(day.isoformat(), device)[state]):
+                row[hour] += seconds
+            day += timedelta(days=1)
+        self.save()
+        return grid
+
+    def save(self):
+        if not self.dirty: return
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.grids, f)
+        os.replace(tmp_file, self.path)
+        self.dirty = False
+
+def blend_color(color_a, color_b, amount):
+    """Linear mix of two '#RRGGBB' colors."""
+    a = [int(color_a[i:i + 2], 16) for i in (1, 3, 5)]
+    b = [int(color_b[i:i + 2], 16) for i in (1, 3, 5)]
+    return '#' + ''.join(f"{round(x + (y - x) * amount):02x}" for x, y in zip(a, b))
+
+# --- NEW: Streaming export ---
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+EVENT_EXPORT_FIELDS = ['time', 'device', 'type', 'event', 'clip', 'process', 'exe', 'title', 'state', 'end', 'seconds'] # Last five are rollup fields
+SESSION_EXPORT_FIELDS = ['device', 'title', 'process', 'app', 'category', 'state', 'start', 'end', 'seconds']
+PARQUET_ROW_GROUP_SIZE = 50000
+
+def iter_events_in_range(sources, start_day, end_day):
+    """Streams merged raw events from (device, path) sources for start_day..end_day (inclusive)."""
+    end = f"{end_day}~" # '~' sorts after any ISO time on end_day
+    for entry in merge_log_streams([iter_log_file(path, device) for device, path in sources]):
+        entry_time = entry.get('time', '')
+        if entry_time < start_day: continue
+        if entry_time >= end: break # The merged stream is time ordered
+        yield {field: entry.get(field) for field in EVENT_EXPORT_FIELDS}
+
+def iter_sessions_in_range(sources, classifier, start_day, end_day):
+    """Streams sessions starting within start_day..end_day, built from the merged events of (device, path) sources.
+
+    Events before start_day only set each device's starting state; sessions
+    still open at the end of the range are included up to their last event.
+    """
+    end = f"{end_day}~"
+    day_after = (date.fromisoformat(end_day) + timedelta(days=1)).isoformat()
+    engine = SessionEngine(classifier, sessions_file=None, checkpoint_file=None) # In-memory only
+    seeds = {} # (device, kind) -> latest event before the range that still shapes the session state
+    closing = None # Devices whose first event after the range has not been seen yet
+
+    def feed_seeds():
+        for seed in sorted({id(e): e for e in seeds.values()}.values(), key=lambda e: e.get('time', '')):
+            engine.feed(seed)
+        seeds.clear()
+
+    def drain():
+        for session in engine.unsaved:
+            if not start_day <= session.start < end: continue
+            app, category = classifier.classify(session.title, session.process) if session.title or session.process else ('', '')
+            row = session._asdict()
+            row.update(app=app, category=category)
+            yield row
+        engine.unsaved.clear()
+        engine.by_day.clear() # Only the open state is needed from here on
+
+    for entry in merge_log_streams([iter_log_file(path, device) for device, path in sources]):
+        entry_time, device = entry.get('time', ''), entry.get('device')
+        if entry_time < start_day:
+            seeds[(device, None)] = entry
+            if entry.get('type') in ('window', 'activity', 'rollup'): seeds[(device, entry['type'])] = entry
+            continue
+        feed_seeds()
+        if entry_time >= end:
+            # A device's next event ends its last session at midnight (or at a gap), as in the full history
+            if closing is None: closing = set(engine.open)
+            if device in closing:
+                closing.discard(device)
+                engine.feed(entry)
+            if not closing or entry_time >= day_after: break
+            continue
+        engine.feed(entry)
+        if len(engine.unsaved) >= 1000: yield from drain()
+    feed_seeds()
+    with engine.lock:
+        for device, state in engine.open.items():
+            if closing is None or device in closing: engine._close(device, state, state['time'])
+    yield from drain()
+
+def write_export(rows, path, fmt, fields, progress=None, progress_every=5000):
+    """Writes an iterable of row dicts to CSV, NDJSON or Parquet without holding it in memory.
+
+    progress(count) is called every progress_every rows and once at the end.
+    Returns the number of rows written.
+    """
+    count = 0
+    def advance(n=1):
+        nonlocal count
+        previous, count = count, count + n
+        if progress and previous // progress_every != count // progress_every:
+            progress(count)
+
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                advance()
+    elif fmt == 'ndjson':
+        with open(path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps({field: row.get(field) for field in fields}) + '\n')
+                advance()
+    elif fmt == 'parquet':
+        if not PARQUET_ENABLED:
+            raise RuntimeError("Parquet export needs 'pyarrow'. Please install it or choose CSV/NDJSON.")
+        schema = pa.schema([(field, pa.float64() if field == 'seconds' else pa.string()) for field in fields])
+        with pq.ParquetWriter(path, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    advance(len(batch))
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                advance(len(batch))
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if progress: progress(count)
+    return count
+
+def export_activity(kind, fmt, start_day, end_day, path, device_id=None, classifier=None, progress=None):
+    """Exports raw 'events' or derived 'sessions' for a date range. Usable without the GUI."""
+    if kind == 'events':
+        rows = iter_events_in_range(get_stream_sources(device_id or get_device_id()), start_day, end_day)
+        fields = EVENT_EXPORT_FIELDS
+    elif kind == 'sessions':
+        rows = iter_sessions_in_range(get_stream_sources(device_id or get_device_id()), classifier or AppClassifier(), start_day, end_day)
+        fields = SESSION_EXPORT_FIELDS
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+    return write_export(rows, path, fmt, fields, progress)
+
+# --- NEW: Full-text search index ---
+SEARCH_DB_FILE = os.path.expanduser('~/.activity_search.db')
+SEARCHABLE_TYPES = ('window', 'clipboard')
+EVENT_IDENTITY = "device, time, type, event, IFNULL(clip, '')" # NULLs never collide in a UNIQUE index
+
+class SearchIndex:
+    """Incrementally maintained full-text index over window titles and clipboard events.
+
+    Uses an SQLite FTS5 table ranked by bm25, or LIKE queries when SQLite was
+    built without FTS5. add() only queues the entry; rows are written in batches.
+    With FTS5, clipboard events are indexed by the full clip text from clip_text(digest);
+    the indexed text is kept in events.body, which events_fts takes its content from.
+    """
+    FLUSH_SIZE = 200
+
+    def __init__(self, path=SEARCH_DB_FILE, clip_text=None):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.clip_text = clip_text
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, time TEXT, device TEXT, type TEXT, event TEXT)")
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(events)")}
+        if 'clip' not in columns:
+            self.db.execute("ALTER TABLE events ADD COLUMN clip TEXT")
+        if 'body' not in columns:
+            # Older indexes pointed events_fts at events.event, which differs from the text indexed for clips
+            self.db.execute("ALTER TABLE events ADD COLUMN body TEXT")
+            self.db.execute("UPDATE events SET body = event")
+            if clip_text:
+                self.db.executemany("UPDATE events SET body = ? WHERE id = ?",
+                                    [(f"{event}\n{clip_text(clip) or ''}", row_id)
+                                     for row_id, event, clip in self.db.execute("SELECT id, event, clip FROM events WHERE clip IS NOT NULL").fetchall()])
+            self.db.execute("DROP TABLE IF EXISTS events_fts")
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_time ON events(time)")
+        # How far catch_up has walked each device's stream; live add()s don't move it
+        self.db.execute("CREATE TABLE IF NOT EXISTS caught_up (device TEXT PRIMARY KEY, time TEXT)")
+        try:
+            if not self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'").fetchone():
+                self.db.execute("CREATE VIRTUAL TABLE events_fts USING fts5(body, content='events', content_rowid='id')")
+                self.db.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            self.fts_enabled = False
+        self.create_identity_index()
+        self.db.commit()
+        self.catch_up_lock = threading.Lock()
+        self.catch_up_generation = 0
+
+    def create_identity_index(self):
+        """An event is identified by (device, time, type, event, clip); indexes built before that was enforced are deduplicated once.
+
+        Several clips can share a timestamp, so the text and clip digest are part of the key.
+        """
+        self.db.execute("UPDATE events SET device = '' WHERE device IS NULL")
+        existing = self.db.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'events_identity'").fetchone()
+        if existing and 'clip' not in existing[0]:
+            self.db.execute("DROP INDEX events_identity") # Keyed on (device, time, type) only
+        try:
+            self.db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS events_identity ON events({EVENT_IDENTITY})")
+        except sqlite3.IntegrityError:
+            self.db.execute(f"DELETE FROM events WHERE id NOT IN (SELECT MIN(id) FROM events GROUP BY {EVENT_IDENTITY})")
+            self.db.execute(f"CREATE UNIQUE INDEX events_identity ON events({EVENT_IDENTITY})")
+            if self.fts_enabled:
+                self.db.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+        self.db.execute("DROP INDEX IF EXISTS events_device_time")
+
+    def add(self, entry):
+        if entry.get('type') not in SEARCHABLE_TYPES: return
+        event, clip = entry.get('event', ''), entry.get('clip')
+        text = event
+        if clip and self.fts_enabled and self.clip_text:
+            text = f"{event}\n{self.clip_text(clip) or ''}"
+        with self.lock:
+            self.pending.append((entry.get('time', ''), entry.get('device') or '', entry['type'], event, clip, text))
+            if len(self.pending) < self.FLUSH_SIZE: return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending: return
+            rows, self.pending = self.pending, []
+            for row in rows:
+                # Live add()s and catch_up can both see the same entry; the identity index keeps the first
+                cursor = self.db.execute("INSERT OR IGNORE INTO events (time, device, type, event, clip, body) VALUES (?, ?, ?, ?, ?, ?)", row)
+                if cursor.rowcount == 1 and self.fts_enabled:
+                    # Clips are indexed by their full text, not the stored preview
+                    self.db.execute("INSERT INTO events_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, row[5]))
+            self.db.commit()
+
+    def catch_up(self, data):
+        """Indexes the entries of data past each device's caught_up mark; pass a snapshot, not a list still being appended to.
+
+        One catch-up runs at a time, and a newer call makes any older one stop at its next flush.
+        """
+        with self.lock:
+            self.catch_up_generation += 1
+            generation = self.catch_up_generation
+        with self.catch_up_lock:
+            with self.lock:
+                caught_up = dict(self.db.execute("SELECT device, time FROM caught_up").fetchall())
+            progress = {}
+            for i, entry in enumerate(data, 1):
+                if not isinstance(entry, dict): continue
+                device, entry_time = entry.get('device') or '', entry.get('time', '')
+                if entry_time <= (caught_up.get(device) or ''): continue
+                self.add(entry)
+                progress[device] = max(progress.get(device, ''), entry_time)
+                if i % self.FLUSH_SIZE == 0 and generation != self.catch_up_generation: break
+            self.flush()
+            with self.lock:
+                self.db.executemany("INSERT OR REPLACE INTO caught_up (device, time) VALUES (?, ?)", progress.items())
+                self.db.commit()
+
+    def search(self, query, start_day=None, end_day=None, limit=200):
+        """Returns (results, elapsed_ms); results are (time, device, type, event, clip) rows, best match first."""
+        started = time.perf_counter()
+        self.flush()
+        terms = query.split()
+        if not terms: return [], 0.0
+        start = start_day or ''
+        end = f"{end_day}~" if end_day else '~' # '~' sorts after any ISO time on that day
+        with self.lock:
+            if self.fts_enabled:
+                match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+                rows = self.db.execute(
+                    "SELECT e.time, e.device, e.type, e.event, e.clip FROM events_fts JOIN events e ON e.id = events_fts.rowid "
+                    "WHERE events_fts MATCH ? AND e.time >= ? AND e.time < ? ORDER BY bm25(events_fts) LIMIT ?",
+                    (match, start, end, limit)).fetchall()
+            else:
+                where = ' AND '.join(['event LIKE ?'] * len(terms))
+                rows = self.db.execute(
+                    f"SELECT time, device, type, event, clip FROM events WHERE {where} AND time >= ? AND time < ? ORDER BY time DESC LIMIT ?",
+                    [f"%{term}%" for term in terms] + [start, end, limit]).fetchall()
+        return rows, (time.perf_counter() - started) * 1000
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.db.close()
+
+# --- NEW: Clipboard history store ---
+CLIPBOARD_DIR = os.path.expanduser('~/.activity_clipboard')
+CLIPBOARD_STORE_BYTES = 64 * 1024 * 1024 # Least recently copied clips are evicted past this
+CLIP_PREVIEW_CHARS = 100
+CLIP_INDEX_BYTES = 64 * 1024 # Full-text search covers the start of each clip
+CLIP_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+def clip_digest(text):
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def clipboard_sequence_number():
+    """Windows bumps this on every clipboard change; elsewhere returns None and the clipboard is read."""
+    if platform.system() != 'Windows': return None
+    try:
+        import win32clipboard
+        return win32clipboard.GetClipboardSequenceNumber()
     except Exception:
-        return "Could not get window title"
+        return None
+
+class ClipboardStore:
+    """Clipboard history stored by content hash, so each distinct clip is kept once.
+
+    Clips are files named by their sha256 digest; index.json maps digest to
+    [size, last copied] in least-recently-copied order, and the oldest clips
+    are evicted once the store grows past max_bytes. Each put() only appends
+    its changes to index.journal, which is folded into index.json every
+    JOURNAL_LIMIT lines. The directory is private to the user.
+    """
+    JOURNAL_LIMIT = 500
+    def __init__(self, path=CLIPBOARD_DIR, max_bytes=CLIPBOARD_STORE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(path, 'index.json')
+        self.journal_file = os.path.join(path, 'index.journal')
+        self.lock = threading.Lock()
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        os.chmod(path, 0o700) # Clips can hold passwords; also tightens stores created before this
+        self.index = self.load_index()
+        self.total_bytes = sum(size for size, _ in self.index.values())
+        self.save_index() # Starts a fresh journal
+
+    def load_index(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            index = {}
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue # A line cut short by a crash
+                    index.pop(change[0], None)
+                    if len(change) == 3: index[change[0]] = change[1:] # [digest, size, time]; [digest] was an eviction
+        except OSError:
+            pass
+        # Reconcile with the files on disk so a lost index never leaves clips that can't be evicted
+        files = {name for name in os.listdir(self.path) if CLIP_DIGEST.fullmatch(name)}
+        index = {digest: meta for digest, meta in index.items() if digest in files}
+        for digest in files - index.keys():
+            clip_file = os.path.join(self.path, digest)
+            index[digest] = [os.path.getsize(clip_file), os.path.getmtime(clip_file)]
+        return dict(sorted(index.items(), key=lambda item: item[1][1]))
+
+    def save_index(self):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, self.index_file)
+        open(self.journal_file, 'w').close()
+        self.journal_lines = 0
+
+    def journal(self, changes):
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(change) + '\n' for change in changes)
+        self.journal_lines += len(changes)
+        if self.journal_lines >= self.JOURNAL_LIMIT: self.save_index()
+
+    def put(self, text, digest=None):
+        """Stores text unless already present, marks it most recently copied and returns its digest."""
+        digest = digest or clip_digest(text)
+        with self.lock:
+            meta = self.index.pop(digest, None)
+            if meta:
+                size = meta[0]
+            else:
+                data = text.encode('utf-8', 'surrogatepass')
+                clip_file = os.path.join(self.path, digest)
+                with open(clip_file + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(clip_file + '.tmp', clip_file)
+                size = len(data)
+                self.total_bytes += size
+            self.index[digest] = [size, time.time()]
+            changes = [[digest] + self.index[digest]]
+            while self.total_bytes > self.max_bytes and len(self.index) > 1:
+                oldest = next(iter(self.index))
+                self.total_bytes -= self.index.pop(oldest)[0]
+                changes.append([oldest])
+                try:
+                    os.remove(os.path.join(self.path, oldest))
+                except OSError:
+                    pass
+            self.journal(changes)
+        return digest
+
+    def get(self, digest, max_bytes=None):
+        """Returns the clip's text (or its first max_bytes), or None once it has been evicted."""
+        if not digest or not CLIP_DIGEST.fullmatch(digest): return None
+        try:
+            with open(os.path.join(self.path, digest), 'rb') as f:
+                data = f.read(max_bytes) if max_bytes else f.read()
+        except OSError:
+            return None
+        return data.decode('utf-8', 'surrogatepass' if max_bytes is None else 'ignore')
+
+# --- NEW: Collector (shared by the GUI and the headless daemon) ---
+COLLECTOR_SOCKET = os.path.expanduser('~/.activity_logger.sock')
+COLLECTOR_PORT = 47615 # Loopback TCP where Unix sockets are unavailable (Windows)
+COLLECTOR_STATUS_INTERVAL = 1.0 # seconds
+COLLECTOR_TOKEN_FILE = os.path.expanduser('~/.activity_logger.token') # TCP viewers must send its token
+COLLECTOR_RETRY_MS = 5000
+
+def make_log_entry(event_type, event_description, device_id, timestamp=None, fields=None):
+    entry = {'time': timestamp or clock.now().isoformat(), 'type': event_type, 'event': event_description, 'device': device_id}
+    if fields: entry.update(fields) # e.g. 'clip': the digest of the full clipboard text
+    return entry
+
+class LogOwnerLock:
+    """Makes one process the only writer of a log file, and serializes that process's writer threads.
+
+    claim() takes an OS lock on <log>.lock (flock, or msvcrt on Windows) that
+    is held until the process exits, so a crashed owner never blocks the next.
+    Appends and compaction run inside `with lock:`, which claims the log if
+    needed and refuses to write when another process owns it.
+    """
+    def __init__(self, log_file):
+        self.path = f"{log_file}.lock"
+        self.thread_lock = threading.Lock()
+        self.handle = None
+
+    def claim(self):
+        """Returns True if this process owns the log."""
+        if self.handle: return True
+        handle = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+    def release(self):
+        if not self.handle: return
+        if not fcntl:
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        self.handle.close()
+        self.handle = None
+
+    def __enter__(self):
+        if not self.claim():
+            raise RuntimeError(f"{self.path[:-len('.lock')]} is written by another process")
+        self.thread_lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.thread_lock.release()
+
+def append_log_entry(path, entry, lock):
+    append_log_entries(path, [entry], lock)
+
+def append_log_entries(path, entries, lock):
+    with lock, open(path, 'a', encoding='utf-8') as f:
+        f.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+ACTIVITY_PROBE_INTERVAL = 1.0 # seconds
+CLIPBOARD_PROBE_INTERVAL = 2.0
+PROBE_SLACK = 0.25 # A probe may run this much early so it shares a wakeup with another
+
+class ProbeScheduler:
+    """Runs probe coroutines on one asyncio loop, each at its own interval.
+
+    A wakeup runs every probe due within `slack` seconds, so probes share
+    wakeups instead of each sleeping on its own, and after_wake() runs once
+    per wakeup. Probes are short blocking calls and run in turn. Time comes
+    from the module clock, so a VirtualClock makes a run deterministic.
+    """
+    def __init__(self, slack=PROBE_SLACK):
+        self.slack = slack
+        self.probes = [] # [next_due, interval, probe]
+        self.wakeups = 0
+
+    def add(self, interval, probe):
+        self.probes.append([clock.time(), interval, probe])
+
+    async def run(self, running, after_wake=None):
+        while running() and self.probes:
+            now = clock.time()
+            self.wakeups += 1
+            for entry in self.probes:
+                next_due, interval, probe = entry
+                if next_due > now + self.slack: continue
+                try:
+                    await probe()
+                except Exception as e:
+                    print(f"Probe {probe.__name__} failed: {e}")
+                # Keeps to the interval grid, but skips missed runs after a stall instead of bursting
+                entry[0] = next_due + interval if next_due + interval > now else now + interval
+            if after_wake: after_wake()
+            await clock.wait(max(0.0, min(entry[0] for entry in self.probes) - clock.time()))
+
+class ActivityCollector:
+    """Captures idle/active changes, window switches and clipboard copies into event_queue.
+
+    The GUI runs it in-process when no collector daemon is running; otherwise
+    the daemon runs it and the GUI only mirrors its state.
+    """
+    def __init__(self, config, clipboard_store=None):
+        self.config = config
+        self.clipboard_store = clipboard_store
+        self.process_identities = ProcessIdentityCache()
+        self.is_idle = False
+        self.last_app = None
+        self.last_pid = None # Foreground pid from the latest window probe, reused by the resource sampler
+        self.running = False
+        self.batch = None # Events of the current wakeup; None sends each one straight to event_queue
+        self.last_digest, self.last_sequence = None, None
+
+    def start(self):
+        # One thread runs every probe; the input listeners are pynput's own threads
+        self.running = True
+        threading.Thread(target=self.run_probes, daemon=True).start()
+        if IDLE_DETECTION_ENABLED:
+            threading.Thread(target=start_listeners, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def scheduler(self):
+        scheduler = ProbeScheduler()
+        scheduler.add(ACTIVITY_PROBE_INTERVAL, self.probe_activity)
+        if CLIPBOARD_ENABLED:
+            scheduler.add(CLIPBOARD_PROBE_INTERVAL, self.probe_clipboard)
+        return scheduler
+
+    def run_probes(self):
+        self.batch = []
+        asyncio.run(self.scheduler().run(lambda: self.running, self.flush))
+
+    def emit(self, event_type, event_description, **fields):
+        # Stamped at capture, so time spent in the queue never shifts the event
+        item = (event_type, event_description, clock.now().isoformat())
+        if fields: item += (fields,)
+        if self.batch is None:
+            event_queue.put(item)
+        else:
+            self.batch.append(item)
+
+    def flush(self):
+        """Hands the wakeup's events to the consumer as one ('batch', [...]) item."""
+        if self.batch:
+            event_queue.put(('batch', self.batch))
+            self.batch = []
+
+    async def probe_activity(self):
+        self.check_activity()
+
+    async def probe_clipboard(self):
+        try:
+            self.check_clipboard()
+        except Exception: pass # No clipboard access (e.g. no display); try again next time
+
+    def check_clipboard(self):
+        sequence = clipboard_sequence_number()
+        if sequence is not None and sequence == self.last_sequence: return # Unchanged, skip reading it
+        self.last_sequence = sequence
+        current_content = pyperclip.paste()
+        if not current_content: return
+        # Only the digest is kept between polls, never the previous clip itself
+        digest = clip_digest(current_content)
+        if digest != self.last_digest:
+            self.last_digest = digest
+            if self.clipboard_store: self.clipboard_store.put(current_content, digest)
+            # The preview stays in the log: the store is local to this device and evicts old clips,
+            # while the log is what other devices, exports and the LIKE search fallback read
+            log_content = (current_content[:CLIP_PREVIEW_CHARS] + '...') if len(current_content) > CLIP_PREVIEW_CHARS else current_content
+            self.emit('clipboard', f'Copied: "{log_content}"', clip=digest)
+
+    def check_activity(self):
+        """One probe: emits idle/active changes and window switches."""
+        time_since_last_activity = clock.time() - last_activity_time
+        
+        if time_since_last_activity > self.config.get('idle_threshold_minutes', 5) * 60:
+            if not self.is_idle:
+                self.is_idle = True
+                self.emit('activity', "Status: User is Idle")
+                self.last_app = None
+        else:
+            if self.is_idle:
+                self.is_idle = False
+                self.emit('activity', "Status: User is Active")
+            
+            window = self.probe_window()
+            self.last_pid = window.pid
+            if window.title and window.title != self.last_app:
+                self.last_app = window.title
+                identity = {'process': window.process, 'exe': window.exe} if window.process else {}
+                self.emit('window', f"Switched to: {window.title}", **identity)
+
+    def probe_window(self):
+        title, pid = get_active_window()
+        exe, process = self.process_identities.lookup(pid)
+        return WindowInfo(title, pid, exe, process)
+
+def write_private_file(path, text):
+    """Writes text to a file only the current user may read (mode 0600 where the OS supports it)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.chmod(path, 0o600) # An existing file keeps its old mode otherwise
+
+def use_unix_socket():
+    return hasattr(socket, 'AF_UNIX') and platform.system() != 'Windows'
+
+def connect_to_collector(timeout=0.5):
+    """Returns a socket attached to a running collector daemon, or None."""
+    try:
+        if use_unix_socket():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(COLLECTOR_SOCKET)
+        else:
+            with open(COLLECTOR_TOKEN_FILE, 'r', encoding='utf-8') as f:
+                token = f.read().strip()
+            sock = socket.create_connection(('127.0.0.1', COLLECTOR_PORT), timeout=timeout)
+            sock.sendall((token + '\n').encode('ascii')) # Any local user can reach the port; only this one can read the token
+        sock.settimeout(None)
+        return sock
+    except OSError:
+        return None
+
+class CollectorHost:
+    """Background jobs of whichever process owns the log: the daemon, or a GUI collecting in-process.
+
+    Needs running, collector, resource_sampler, log_file, log_lock, config,
+    classifier and device_id; on_compacted() is called after a compaction.
+    """
+    compaction_running = False
+
+    def track_resources(self):
+        while self.running:
+            time.sleep(self.resource_sampler.interval)
+            try:
+                self.resource_sampler.sample(self.collector.last_pid)
+            except Exception as e:
+                print(f"Resource sampling failed: {e}")
+            self.resource_sampler.next_interval(self.collector.is_idle)
+
+    def compact_old_events(self):
+        try:
+            days = compact_log_file(self.log_file, self.config.get('raw_retention_days', 30),
+                                    self.classifier, self.log_lock, self.device_id)
+            if days:
+                print(f"Compacted {days} old day(s) of raw events into rollups.")
+                self.on_compacted()
+        except Exception as e:
+            print(f"Log compaction failed: {e}")
+        finally:
+            self.compaction_running = False
+
+class CollectorDaemon(CollectorHost):
+    """Standalone collector process: tracks activity, writes the log and streams events to viewers.
+
+    Any number of GUIs can attach over the local socket; each receives one JSON
+    message per line: {'kind': 'entry', 'entry': {...}}, {'kind': 'entries',
+    'entries': [...]} (one collector wakeup), {'kind': 'status', ...} or
+    {'kind': 'compacted'}. A viewer that can't keep up is dropped, so UI
+    stalls never hold up capture.
+    """
+    def __init__(self, log_file=LOG_FILE):
+        self.log_file = log_file
+        self.log_lock = LogOwnerLock(log_file)
+        self.device_id = get_device_id()
+        self.config = {'idle_threshold_minutes': 5, 'raw_retention_days': 30}
+        self.clipboard_store = ClipboardStore() if CLIPBOARD_ENABLED else None
+        self.collector = ActivityCollector(self.config, self.clipboard_store)
+        self.classifier = AppClassifier()
+        self.resource_sampler = ResourceSampler() if SPECS_ENABLED else None
+        self.mouse_clicks = 0
+        self.viewers = []
+        self.viewers_lock = threading.Lock()
+        self.token = None
+        self.running = True
+
+    def open_listener(self):
+        if connect_to_collector():
+            raise SystemExit("A collector is already running.")
+        if not self.log_lock.claim(): # E.g. a GUI collecting in-process
+            raise SystemExit(f"Another process is already collecting into {self.log_file}.")
+        if use_unix_socket():
+            if os.path.exists(COLLECTOR_SOCKET): os.remove(COLLECTOR_SOCKET) # Stale socket from a crash
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(COLLECTOR_SOCKET)
+            os.chmod(COLLECTOR_SOCKET, 0o600)
+        else:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', COLLECTOR_PORT))
+            self.token = secrets.token_hex(16)
+            write_private_file(COLLECTOR_TOKEN_FILE, self.token)
+        listener.listen(8)
+        return listener
+
+    def serve_forever(self):
+        self.listener = self.open_listener()
+        print(f"Collector running (device {self.device_id}), logging to {self.log_file}")
+        threading.Thread(target=self.accept_viewers, daemon=True).start()
+        threading.Thread(target=self.run_retention, daemon=True).start()
+        if self.resource_sampler:
+            threading.Thread(target=self.track_resources, daemon=True).start()
+        self.collector.start()
+        try:
+            self.pump()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            self.collector.stop()
+            if self.resource_sampler: self.resource_sampler.flush()
+            self.listener.close()
+            if use_unix_socket() and os.path.exists(COLLECTOR_SOCKET): os.remove(COLLECTOR_SOCKET)
+            self.log_lock.release()
+
+    def status(self):
+        return {'kind': 'status', 'clicks': self.mouse_clicks, 'idle': self.collector.is_idle, 'app': self.collector.last_app}
+
+    def pump(self):
+        """Writes queued events to the log and forwards them to the viewers."""
+        last_status, last_status_time = None, 0
+        while self.running:
+            try:
+                item = event_queue.get(timeout=COLLECTOR_STATUS_INTERVAL)
+                if item[0] == 'click':
+                    self.mouse_clicks += 1
+                elif item[0] == 'batch':
+                    entries = [make_log_entry(*event[:2], self.device_id, *event[2:]) for event in item[1]]
+                    append_log_entries(self.log_file, entries, self.log_lock)
+                    self.broadcast({'kind': 'entries', 'entries': entries})
+                else:
+                    entry = make_log_entry(*item[:2], self.device_id, *item[2:])
+                    append_log_entry(self.log_file, entry, self.log_lock)
+                    self.broadcast({'kind': 'entry', 'entry': entry})
+            except queue.Empty:
+                pass
+            status = self.status()
+            if status != last_status and time.monotonic() - last_status_time >= COLLECTOR_STATUS_INTERVAL:
+                self.broadcast(status)
+                last_status, last_status_time = status, time.monotonic()
+
+    def accept_viewers(self):
+        while self.running:
+            try:
+                viewer, _ = self.listener.accept()
+            except OSError:
+                return
+            viewer.settimeout(0.5) # A stalled viewer is dropped instead of blocking capture
+            if self.token and not self.check_token(viewer):
+                viewer.close()
+                continue
+            try:
+                viewer.sendall((json.dumps(self.status()) + '\n').encode('utf-8'))
+            except OSError:
+                viewer.close()
+                continue
+            with self.viewers_lock:
+                self.viewers.append(viewer)
+
+    def check_token(self, viewer):
+        """TCP viewers must start by sending the token from COLLECTOR_TOKEN_FILE."""
+        received, deadline = b'', time.monotonic() + 1
+        try:
+            while not received.endswith(b'\n') and len(received) < 128 and time.monotonic() < deadline:
+                chunk = viewer.recv(128 - len(received))
+                if not chunk: break
+                received += chunk
+        except OSError:
+            return False
+        return hmac.compare_digest(received.strip(), self.token.encode('ascii'))
+
+    def broadcast(self, message):
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self.viewers_lock:
+            for viewer in list(self.viewers):
+                try:
+                    viewer.sendall(data)
+                except OSError:
+                    self.viewers.remove(viewer)
+                    viewer.close()
+
+    def run_retention(self):
+        time.sleep(60)
+        while self.running:
+            self.compact_old_events()
+            time.sleep(RETENTION_CHECK_INTERVAL_MS / 1000)
+
+    def on_compacted(self):
+        self.broadcast({'kind': 'compacted'})
 
 # --- Main Application Class ---
-class ActivityLoggerApp:
-    def __init__(self, root):
+class ActivityLoggerApp(CollectorHost):
+    def __init__(self, root, collector=None, attach_to_daemon=True):
         self.root = root
         self.root.title("Activity Logger")
         self.root.geometry("1200x800")
@@ -127,6 +1901,7 @@ class ActivityLoggerApp:
         self.config = {
             'idle_threshold_minutes': 5,
             'daily_work_goal_hours': 4,
+            'raw_retention_days': 30, # Older days are compacted into session rollups
         }
 
         font_family = "Segoe UI" if platform.system() == "Windows" else "Helvetica"
@@ -138,25 +1913,39 @@ class ActivityLoggerApp:
 
         self.setup_theme()
 
-        self.log_file = os.path.expanduser('~/.activity_log.jsonl')
+        self.log_file = LOG_FILE
+        self.log_lock = LogOwnerLock(self.log_file)
+        self.compaction_running = False
+        self.loaded_until = '' # Time of the newest local entry in the last load; older daemon entries are already in it
+        self.device_id = get_device_id()
         self.data = [] # Initially empty, will be loaded
+        self.classifier = AppClassifier()
+        self.session_engine = SessionEngine(self.classifier)
+        self.heatmap_cache = HeatmapCache(self.session_engine)
+        self.resource_sampler = ResourceSampler() if SPECS_ENABLED else None
+        self.clipboard_store = ClipboardStore()
+        self.search_index = SearchIndex(clip_text=lambda digest: self.clipboard_store.get(digest, CLIP_INDEX_BYTES))
         
+        # Today's totals, refreshed from the session engine
         self.active_time_seconds = 0
         self.idle_time_seconds = 0
-        self.app_usage = defaultdict(float)
-        self.last_app = None
-        self.last_app_start_time = time.time()
+        self.app_usage = {}
         self.mouse_clicks = 0
+        # Runs in-process unless a collector daemon is running; then it only mirrors the daemon's state
+        self.collector = collector or ActivityCollector(self.config, self.clipboard_store if CLIPBOARD_ENABLED else None)
+        self.attach_to_daemon = attach_to_daemon
+        self.collector_link = None
         
         # --- NEW: Google API variables ---
         self.google_creds = None
         self.user_profile = None
         self.drive_service = None
+        self.drive_worker = DriveWorker(event_queue)
+        self.backup_scheduled = False
 
         self.icons = self.load_icons()
         self.create_widgets()
         
-        self.is_idle = False
         self.running = True
         self.start_background_tasks()
         self.show_page("Dashboard")
@@ -165,6 +1954,7 @@ class ActivityLoggerApp:
         self.load_initial_data()
         
         self.root.protocol("WM_DELETE_WINDOW", self.hide_window)
+        self.icon = None # Set by setup_tray_icon when the tray is available
         threading.Thread(target=self.setup_tray_icon, daemon=True).start()
 
     def load_initial_data(self):
@@ -172,8 +1962,7 @@ class ActivityLoggerApp:
         if GOOGLE_API_ENABLED:
             self.check_google_login()
         else:
-            self.data = self.load_log_from_local_file()
-            self.pre_calculate_today_stats()
+            self.set_data(self.load_log_from_local_file())
             self.update_dashboard_live()
 
     def create_widgets(self):
@@ -195,10 +1984,38 @@ class ActivityLoggerApp:
             "Dashboard": DashboardPage(self.main_page_container, self),
             "Reports": ReportsPage(self.main_page_container, self),
             "Logs": LogsPage(self.main_page_container, self),
+            "Search": SearchPage(self.main_page_container, self),
             "System Info": SystemInfoPage(self.main_page_container, self),
             "About": AboutPage(self.main_page_container, self)
         }
     
+    def setup_theme(self):
+        self.theme_colors = {
+            "bg": "#F0F2F5", "frame": "#FFFFFF", "text": "#1C1E21", "accent": "#1877F2",
+            "sidebar": "#1E2A38", "sidebar_text": "#C8D1DC",
+        }
+        self.root.configure(bg=self.theme_colors["bg"])
+        style = ttk.Style(self.root)
+        if "clam" in style.theme_names(): style.theme_use("clam")
+        style.configure("Treeview", font=self.fonts["primary"], rowheight=24, background=self.theme_colors["frame"], fieldbackground=self.theme_colors["frame"])
+        style.configure("Treeview.Heading", font=self.fonts["header"])
+
+    def create_top_bar(self):
+        top_bar = tk.Frame(self.main_content_frame, bg=self.theme_colors["frame"], height=50)
+        top_bar.pack(fill="x")
+        top_bar.pack_propagate(False)
+        self.page_title_var = tk.StringVar(value="")
+        tk.Label(top_bar, textvariable=self.page_title_var, font=self.fonts["card_title"],
+                 bg=self.theme_colors["frame"], fg=self.theme_colors["text"]).pack(side="left", padx=20)
+
+    def create_sidebar_button(self, text, icon, parent=None):
+        button = tk.Button(parent or self.sidebar_frame, text=f"  {text}", image=icon, compound="left", anchor="w",
+                           font=self.fonts["header"], bg=self.theme_colors["sidebar"], fg=self.theme_colors["sidebar_text"],
+                           activebackground=self.theme_colors["accent"], activeforeground="#FFFFFF",
+                           relief="flat", bd=0, padx=20, pady=8, cursor="hand2", command=lambda: self.show_page(text))
+        button.pack(fill="x")
+        self.sidebar_buttons[text] = button
+
     def create_sidebar(self):
         # ... (Previous sidebar creation code)
         tk.Label(self.sidebar_frame, text="Activity Logger", font=self.fonts["sidebar_title"], 
@@ -213,10 +2030,13 @@ class ActivityLoggerApp:
         
         self.profile_name_label = tk.Label(self.profile_frame, text="", font=self.fonts["header"], bg=self.theme_colors["sidebar"], fg="white")
         self.logout_button = tk.Button(self.profile_frame, text="Logout", command=self.google_logout, font=self.fonts["primary"])
+        self.sync_status_var = tk.StringVar(value="")
+        tk.Label(self.profile_frame, textvariable=self.sync_status_var, font=self.fonts["primary"],
+                 bg=self.theme_colors["sidebar"], fg=self.theme_colors["sidebar_text"]).pack(side="bottom")
 
         self.sidebar_buttons = {}
         # --- NEW: Reports button added ---
-        buttons_to_create = ["Dashboard", "Reports", "Logs"]
+        buttons_to_create = ["Dashboard", "Reports", "Logs", "Search"]
         for text in buttons_to_create:
             self.create_sidebar_button(text, self.icons.get(text.lower()))
         
@@ -227,47 +2047,85 @@ class ActivityLoggerApp:
 
     # --- NEW: Google API Functions ---
     def check_google_login(self):
-        """Checks if a valid token.json exists."""
+        """Loads the local data, then connects to Drive if a valid token.json exists."""
+        # Local data first: the collector is already running and the Drive sync may take a while or fail
+        self.set_data(self.load_log_from_local_file())
+        self.update_dashboard_live()
         creds = None
         if os.path.exists('token.json'):
             creds = Credentials.from_authorized_user_file('token.json', SCOPES)
         if creds and creds.valid:
             self.google_creds = creds
             self.on_google_login_success()
-        else:
-            self.data = self.load_log_from_local_file()
-            self.pre_calculate_today_stats()
-            self.update_dashboard_live()
 
     def google_login(self):
-        """Starts the Google login flow."""
+        """Starts the Google login flow on the Drive worker."""
         if not os.path.exists(CREDENTIALS_FILE):
             messagebox.showerror("Error", f"'{CREDENTIALS_FILE}' not found. Please download it from Google Cloud Console.")
             return
         
+        self.login_button.config(state="disabled")
+        self.sync_status_var.set("Waiting for Google login...")
+        # The browser flow is interactive, so it is never retried
+        self.drive_worker.submit(self.run_login_flow, retries=0,
+                                 on_success=self.on_login_flow_done, on_error=self.on_google_error)
+
+    def run_login_flow(self):
+        """Worker thread: runs the OAuth browser flow and saves token.json."""
         flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-        self.google_creds = flow.run_local_server(port=0)
+        creds = flow.run_local_server(port=0)
         with open('token.json', 'w') as token:
-            token.write(self.google_creds.to_json())
+            token.write(creds.to_json())
+        return creds
+
+    def on_login_flow_done(self, creds):
+        self.login_button.config(state="normal")
+        self.google_creds = creds
         self.on_google_login_success()
 
     def on_google_login_success(self):
         """Called after a successful login."""
         self.login_button.pack_forget()
+        self.profile_name_label.config(text="Connecting...")
         self.profile_name_label.pack()
         self.logout_button.pack(pady=5)
         
-        # Get user profile
-        profile_service = build('oauth2', 'v2', credentials=self.google_creds)
-        self.user_profile = profile_service.userinfo().get().execute()
+        self.drive_worker.submit(self.build_google_services, self.google_creds,
+                                 on_success=self.on_google_services_ready, on_error=self.on_google_error)
+
+    def build_google_services(self, creds):
+        """Worker thread: builds the API clients and fetches the user profile."""
+        profile_service = build('oauth2', 'v2', credentials=creds)
+        user_profile = profile_service.userinfo().get().execute()
+        drive_service = build('drive', 'v3', credentials=creds)
+        return user_profile, drive_service
+
+    def on_google_services_ready(self, result):
+        if self.google_creds is None: return # Logged out meanwhile
+        self.user_profile, self.drive_service = result
         self.profile_name_label.config(text=self.user_profile.get('name', 'User'))
         
-        # Build Drive service
-        self.drive_service = build('drive', 'v3', credentials=self.google_creds)
-        
         # Load data from Drive
         self.load_data_from_drive()
 
+    def on_google_error(self, error):
+        if self.google_creds and is_retryable_error(error):
+            # Offline or Google is down: stay logged in and connect again later
+            self.profile_name_label.config(text="Offline")
+            self.sync_status_var.set("Google unreachable, will retry")
+            self.root.after(GOOGLE_RECONNECT_MS, self.reconnect_google)
+            return
+        # Back to the logged-out state, so the user can retry
+        self.google_creds = None
+        self.user_profile = None
+        self.drive_service = None
+        self.show_logged_out()
+        messagebox.showerror("Google Error", f"Google request failed: {error}")
+
+    def reconnect_google(self):
+        if self.running and self.google_creds and not self.drive_service:
+            self.on_google_login_success()
+
     def google_logout(self):
         """Logs the user out."""
         if os.path.exists('token.json'):
@@ -275,87 +2133,100 @@ class ActivityLoggerApp:
         self.google_creds = None
         self.user_profile = None
         self.drive_service = None
+        self.show_logged_out()
         
+        self.set_data(self.load_log_from_local_file())
+
+    def show_logged_out(self):
+        self.sync_status_var.set("")
+        self.profile_name_label.config(text="")
         self.profile_name_label.pack_forget()
         self.logout_button.pack_forget()
+        self.login_button.config(state="normal")
         self.login_button.pack()
-        
-        self.data = self.load_log_from_local_file()
-        self.pre_calculate_today_stats()
 
     def load_data_from_drive(self):
-        """Loads the log file from Google Drive."""
-        messagebox.showinfo("Syncing", "Loading data from Google Drive...")
-        try:
-            folder_id = self.get_or_create_drive_folder()
-            
-            response = self.drive_service.files().list(
-                q=f"'{folder_id}' in parents and name='activity_log.jsonl'",
-                spaces='drive', fields='files(id, name)').execute()
-            files = response.get('files', [])
-
-            if files:
-                file_id = files[0].get('id')
-                request = self.drive_service.files().get_media(fileId=file_id)
-                fh = io.BytesIO()
+        """Syncs the other devices' log streams from Google Drive in the background."""
+        self.sync_status_var.set("Syncing with Google Drive...")
+        self.drive_worker.submit(self.download_drive_streams, self.drive_service,
+                                 on_success=self.on_drive_streams_loaded, on_error=self.on_drive_load_failed)
+
+    def download_drive_streams(self, drive_service):
+        """Worker thread: downloads every other device's stream into STREAMS_DIR."""
+        folder_id = self.get_or_create_drive_folder(drive_service)
+        
+        response = drive_service.files().list(
+            q=f"'{folder_id}' in parents and name contains 'activity_log'",
+            spaces='drive', fields='files(id, name)').execute()
+        files = response.get('files', [])
+
+        os.makedirs(STREAMS_DIR, exist_ok=True)
+        for file in files:
+            if self.drive_worker.cancelled.is_set(): return
+            name = file.get('name', '')
+            if name == drive_stream_name(self.device_id) or not name.endswith('.jsonl'): continue
+            # Old single-file backups become the 'legacy' stream
+            device = 'legacy' if name == DRIVE_LOG_NAME else name[len('activity_log.'):-len('.jsonl')]
+            if not name.startswith('activity_log.') or not is_valid_device_id(device):
+                print(f"Skipping Drive file with an unexpected name: {name!r}")
+                continue
+            request = drive_service.files().get_media(fileId=file.get('id'))
+            with io.FileIO(os.path.join(STREAMS_DIR, f"{device}.jsonl"), 'wb') as fh:
                 downloader = MediaIoBaseDownload(fh, request)
                 done = False
                 while done is False:
                     status, done = downloader.next_chunk()
-                
-                fh.seek(0)
-                # Decode and parse the file content
-                lines = fh.read().decode('utf-8').splitlines()
-                self.data = [json.loads(line) for line in lines if line]
-                # Save a local copy
-                with open(self.log_file, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(lines))
-            else:
-                self.data = self.load_log_from_local_file()
-            
-            self.pre_calculate_today_stats()
-            self.update_dashboard_live()
-            messagebox.showinfo("Sync Complete", "Data loaded successfully from Google Drive.")
 
-        except Exception as e:
-            messagebox.showerror("Drive Error", f"Could not load data from Drive: {e}")
-            self.data = self.load_log_from_local_file()
-            self.pre_calculate_today_stats()
-            self.update_dashboard_live()
+    def on_drive_streams_loaded(self, _):
+        self.set_data(self.load_log_from_local_file())
+        self.update_dashboard_live()
+        self.sync_status_var.set(f"Synced at {datetime.now().strftime('%H:%M')}")
+
+    def on_drive_load_failed(self, error):
+        self.sync_status_var.set("Sync failed")
+        messagebox.showerror("Drive Error", f"Could not load data from Drive: {error}") # The local data is already loaded
+
+    def schedule_backup(self):
+        """Queues one Drive backup in 5 minutes, however many events arrive meanwhile."""
+        if self.backup_scheduled or not self.drive_service: return
+        self.backup_scheduled = True
+        self.root.after(300000, self.backup_data_to_drive)
 
     def backup_data_to_drive(self):
-        """Uploads the current local log file to Google Drive."""
+        """Uploads this device's log stream to Google Drive in the background."""
+        self.backup_scheduled = False
         if not self.drive_service or not os.path.exists(self.log_file):
             return
+        self.drive_worker.submit(self.upload_log_stream, self.drive_service,
+                                 on_success=lambda _: print("Backup to Drive successful."),
+                                 on_error=lambda e: print(f"Backup to Drive failed: {e}"))
 
-        try:
-            folder_id = self.get_or_create_drive_folder()
-            
-            # Check if file already exists
-            response = self.drive_service.files().list(
-                q=f"'{folder_id}' in parents and name='activity_log.jsonl'",
-                spaces='drive', fields='files(id)').execute()
-            files = response.get('files', [])
-
-            file_metadata = {'name': 'activity_log.jsonl'}
-            media = MediaFileUpload(self.log_file, mimetype='application/json')
-
-            if files:
-                # Update existing file
-                file_id = files[0].get('id')
-                self.drive_service.files().update(fileId=file_id, media_body=media).execute()
-            else:
-                # Create new file
-                file_metadata['parents'] = [folder_id]
-                self.drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-            
-            print("Backup to Drive successful.")
-        except Exception as e:
-            print(f"Backup to Drive failed: {e}")
+    def upload_log_stream(self, drive_service):
+        """Worker thread: creates or updates this device's stream in Drive."""
+        folder_id = self.get_or_create_drive_folder(drive_service)
+        
+        stream_name = drive_stream_name(self.device_id)
+        # Check if file already exists
+        response = drive_service.files().list(
+            q=f"'{folder_id}' in parents and name='{stream_name}'",
+            spaces='drive', fields='files(id)').execute()
+        files = response.get('files', [])
+
+        file_metadata = {'name': stream_name}
+        media = MediaFileUpload(self.log_file, mimetype='application/json')
 
-    def get_or_create_drive_folder(self):
+        if files:
+            # Update existing file
+            file_id = files[0].get('id')
+            drive_service.files().update(fileId=file_id, media_body=media).execute()
+        else:
+            # Create new file
+            file_metadata['parents'] = [folder_id]
+            drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+
+    def get_or_create_drive_folder(self, drive_service):
         """Finds or creates the 'Activity Logger Backups' folder in Drive."""
-        response = self.drive_service.files().list(
+        response = drive_service.files().list(
             q="mimeType='application/vnd.google-apps.folder' and name='Activity Logger Backups'",
             spaces='drive', fields='files(id, name)').execute()
         files = response.get('files', [])
@@ -367,61 +2238,69 @@ class ActivityLoggerApp:
                 'name': 'Activity Logger Backups',
                 'mimeType': 'application/vnd.google-apps.folder'
             }
-            folder = self.drive_service.files().create(body=file_metadata, fields='id').execute()
+            folder = drive_service.files().create(body=file_metadata, fields='id').execute()
             return folder.get('id')
 
-    def log_event(self, event_type, event_description):
-        timestamp = datetime.now().isoformat()
-        entry = {'time': timestamp, 'type': event_type, 'event': event_description}
+    def log_event(self, event_type, event_description, timestamp=None, fields=None):
+        entry = make_log_entry(event_type, event_description, self.device_id, timestamp, fields)
+        append_log_entry(self.log_file, entry, self.log_lock)
+        self.ingest_entry(entry)
+
+    def log_events(self, items):
+        """Logs one collector wakeup's (type, description, time[, fields]) items with a single write."""
+        entries = [make_log_entry(*item[:2], self.device_id, *item[2:]) for item in items]
+        append_log_entries(self.log_file, entries, self.log_lock)
+        for entry in entries: self.ingest_entry(entry)
+
+    def ingest_entry(self, entry):
+        """Adds an already written entry to the in-memory views."""
         self.data.append(entry)
-        
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(entry) + '\n')
+        self.session_engine.feed(entry)
+        self.session_engine.maybe_save()
+        self.search_index.add(entry)
         
         # Schedule a backup to Drive
-        self.root.after(300000, self.backup_data_to_drive) # Backup every 5 mins
+        self.schedule_backup() # Backup every 5 mins
             
-        if self.pages["Logs"].winfo_exists() and self.pages["Logs"].winfo_ismapped():
-            self.pages["Logs"].on_show()
+        self.pages["Logs"].scheduler.invalidate()
+
+    def get_stream_sources(self):
+        return get_stream_sources(self.device_id, self.log_file)
+
+    def get_devices(self):
+        return [device for device, _ in self.get_stream_sources()]
 
     def load_log_from_local_file(self):
-        if not os.path.exists(self.log_file): return []
-        data = []
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-        return data
+        """Loads the local log merged with the synced streams of other devices."""
+        streams = []
+        for device, path in self.get_stream_sources():
+            entries, _ = parse_jsonl_file(path)
+            entries = [entry for entry in entries if isinstance(entry, dict)]
+            for entry in entries: entry.setdefault('device', device)
+            streams.append(entries)
+        if len(streams) == 1: return streams[0]
+        return list(merge_log_streams(streams))
+
+    def set_data(self, data):
+        """Replaces the loaded events and brings the session engine up to date."""
+        self.data = data
+        self.loaded_until = next((entry.get('time', '') for entry in reversed(data) if entry.get('device') == self.device_id), '')
+        self.session_engine.load(data)
+        self.pre_calculate_today_stats()
+        # The first index build over years of history must not block the UI
+        threading.Thread(target=self.search_index.catch_up, args=(list(data),), daemon=True).start()
 
     def pre_calculate_today_stats(self):
-        # ... (No changes in this function)
+        """Refreshes today's totals from the session engine (no pass over the events)."""
         today_str = date.today().isoformat()
-        self.active_time_seconds = 0
-        self.idle_time_seconds = 0
-        last_time = None
-        last_state_idle = False
-
-        for entry in self.data:
-            if not entry.get('time', '').startswith(today_str): continue
-            
-            current_time = datetime.fromisoformat(entry['time'])
-            if last_time:
-                duration = (current_time - last_time).total_seconds()
-                if duration < 600:
-                    if last_state_idle: self.idle_time_seconds += duration
-                    else: self.active_time_seconds += duration
-
-            if 'User is Idle' in entry.get('event', ''): last_state_idle = True
-            elif 'User is Active' in entry.get('event', ''): last_state_idle = False
-            last_time = current_time
+        self.active_time_seconds, self.idle_time_seconds = self.session_engine.day_totals(today_str)
+        self.app_usage = self.session_engine.app_totals(today_str)
     
     # ... (Other functions like setup_tray_icon, hide_window, etc. remain the same)
     def setup_tray_icon(self):
         if not TRAY_ENABLED or not PIL_ENABLED: return
         try:
-            image = Image.open("assets/tray_icon.png")
+            image = Image.open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "tray_icon.png"))
             menu = (item('Show Logger', self.show_window), item('Quit', self.quit_app))
             self.icon = pystray.Icon("Activity Logger", image, "Activity Logger", menu)
             self.icon.run()
@@ -430,13 +2309,22 @@ class ActivityLoggerApp:
 
     def hide_window(self):
         self.root.withdraw()
+        for page in self.pages.values():
+            if hasattr(page, 'scheduler'): page.scheduler.pause()
 
     def show_window(self):
         self.root.deiconify()
+        for page in self.pages.values():
+            if hasattr(page, 'scheduler'): page.scheduler.resume()
 
     def quit_app(self):
         self.running = False
-        self.update_app_usage()
+        self.collector.stop()
+        if self.collector_link: self.collector_link.close() # The daemon keeps collecting
+        self.drive_worker.shutdown()
+        self.session_engine.save()
+        self.search_index.close()
+        if self.resource_sampler: self.resource_sampler.flush()
         if self.icon:
             self.icon.stop()
         self.root.destroy()
@@ -445,7 +2333,7 @@ class ActivityLoggerApp:
         if not PIL_ENABLED: return {}
         icons = {}
         # --- NEW: reports icon added ---
-        icon_names = ["dashboard", "reports", "logs", "info", "about"]
+        icon_names = ["dashboard", "reports", "logs", "search", "info", "about"]
         for name in icon_names:
             try:
                 path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", f"{name}.png")
@@ -466,73 +2354,127 @@ class ActivityLoggerApp:
             self.pages[page_name].on_show()
 
     def start_background_tasks(self):
-        threading.Thread(target=self.track_activity, daemon=True).start()
-        if CLIPBOARD_ENABLED: 
-            threading.Thread(target=self.track_clipboard, daemon=True).start()
-        if IDLE_DETECTION_ENABLED:
-            threading.Thread(target=start_listeners, daemon=True).start()
+        # --- NEW: Attach to the collector daemon when one is running ---
+        if self.attach_to_daemon:
+            self.collector_link = connect_to_collector()
+        if self.collector_link:
+            threading.Thread(target=self.read_collector, args=(self.collector_link,), daemon=True).start()
+        elif self.log_lock.claim():
+            self.start_local_collection()
+        else:
+            print(f"Another process owns {self.log_file}; waiting for its collector.")
+            self.root.after(COLLECTOR_RETRY_MS, self.wait_for_collector)
         self.root.after(200, self.process_queue)
+
+    def wait_for_collector(self):
+        """Attaches once the owner of the log serves it, or collects in-process once nobody owns it."""
+        if not self.running: return
+        self.collector_link = connect_to_collector() if self.attach_to_daemon else None
+        if self.collector_link:
+            print("Attached to the collector daemon.")
+            threading.Thread(target=self.read_collector, args=(self.collector_link,), daemon=True).start()
+            self.set_data(self.load_log_from_local_file()) # Catch up on what was logged while detached
+            self.update_dashboard_live()
+        elif self.log_lock.claim():
+            print("Collecting in-process.")
+            self.start_local_collection()
+        else:
+            self.root.after(COLLECTOR_RETRY_MS, self.wait_for_collector)
     
-    def track_clipboard(self):
-        last_content = ""
-        while self.running:
-            time.sleep(2)
-            try:
-                current_content = pyperclip.paste()
-                if current_content and current_content != last_content:
-                    last_content = current_content
-                    log_content = (current_content[:100] + '...') if len(current_content) > 100 else current_content
-                    event_queue.put(('clipboard', f'Copied: "{log_content}"'))
-            except Exception: pass
+    def start_local_collection(self):
+        self.collector.start()
+        if SPECS_ENABLED:
+            threading.Thread(target=self.track_resources, daemon=True).start()
+        self.root.after(60000, self.run_retention) # The daemon compacts the log when it owns it
+
+    def read_collector(self, sock):
+        """Reader thread: forwards the daemon's messages to process_queue."""
+        try:
+            for line in sock.makefile('r', encoding='utf-8'):
+                try:
+                    event_queue.put(('collector', json.loads(line)))
+                except json.JSONDecodeError:
+                    continue
+        except OSError:
+            pass
+        event_queue.put(('collector_lost', None))
+
+    def handle_collector_message(self, message):
+        kind = message.get('kind')
+        if kind in ('entry', 'entries'):
+            # Already written to the log by the daemon; entries up to loaded_until were also in the file we loaded
+            for entry in message['entries'] if kind == 'entries' else [message['entry']]:
+                if entry.get('time', '') > self.loaded_until: self.ingest_entry(entry)
+        elif kind == 'status':
+            self.mouse_clicks = message.get('clicks', self.mouse_clicks)
+            self.collector.is_idle = message.get('idle', False)
+            self.collector.last_app = message.get('app')
+        elif kind == 'compacted':
+            self.reload_after_compaction()
+
+    # --- NEW: Background retention job ---
+    def run_retention(self):
+        """Starts log compaction in the background, then checks again in 6 hours."""
+        if self.running and not self.compaction_running:
+            self.compaction_running = True
+            threading.Thread(target=self.compact_old_events, daemon=True).start()
+        self.root.after(RETENTION_CHECK_INTERVAL_MS, self.run_retention)
+
+    def on_compacted(self):
+        self.root.after(0, self.reload_after_compaction)
+
+    def reload_after_compaction(self):
+        self.set_data(self.load_log_from_local_file())
+        self.update_dashboard_live()
 
     def process_queue(self):
         try:
             while not event_queue.empty():
-                event_type, event_description = event_queue.get_nowait()
+                item = event_queue.get_nowait()
+                event_type, event_description = item[:2]
                 if event_type == 'click':
                     self.mouse_clicks += 1
+                elif event_type == 'batch':
+                    self.log_events(event_description)
+                elif event_type == 'callback':
+                    callback, value = event_description # A Drive worker result
+                    callback(value)
+                elif event_type == 'collector':
+                    self.handle_collector_message(event_description)
+                elif event_type == 'collector_lost':
+                    if self.running and self.collector_link:
+                        print("Collector daemon stopped.")
+                        self.collector_link = None
+                        self.wait_for_collector()
                 else:
-                    self.log_event(event_type, event_description)
+                    self.log_event(event_type, event_description, *item[2:])
         finally:
             self.root.after(200, self.process_queue)
 
-    def track_activity(self):
-        while self.running:
-            time.sleep(1)
-            time_since_last_activity = time.time() - last_activity_time
-            
-            if time_since_last_activity > self.config.get('idle_threshold_minutes', 5) * 60:
-                if not self.is_idle:
-                    self.is_idle = True
-                    self.log_event('activity', "Status: User is Idle")
-                    self.update_app_usage()
-                self.idle_time_seconds += 1
-            else:
-                if self.is_idle:
-                    self.is_idle = False
-                    self.log_event('activity', "Status: User is Active")
-                    self.last_app_start_time = time.time()
-                self.active_time_seconds += 1
-                
-                title = get_active_window_title()
-                if title and title != self.last_app:
-                    self.update_app_usage(title)
-                    self.log_event('window', f"Switched to: {title}")
-    
-    def update_app_usage(self, new_app=None):
-        now = time.time()
-        if self.last_app:
-            duration = now - self.last_app_start_time
-            self.app_usage[self.last_app] += duration
-        self.last_app = new_app
-        self.last_app_start_time = now
+    def stats_key(self):
+        """Cheap fingerprint of everything the live views are drawn from."""
+        return (id(self.data), len(self.data), self.mouse_clicks, self.collector.last_app, self.classifier.generation)
+
+    def reload_classification_rules(self):
+        """Reloads the app rules and reclassifies all history."""
+        self.classifier.load_rules()
+        self.session_engine.reclassify()
+        self.pre_calculate_today_stats()
+        self.update_dashboard_live()
 
     def update_dashboard_live(self):
-        if self.pages["Dashboard"].winfo_exists():
-            self.pages["Dashboard"].update_stats()
-        self.root.after(2000, self.update_dashboard_live)
+        """Starts the dashboard's render scheduler (only once) and asks for a redraw."""
+        scheduler = self.pages["Dashboard"].scheduler
+        scheduler.start()
+        scheduler.invalidate()
 
 
+# --- Page base class ---
+class BasePage(tk.Frame):
+    def __init__(self, parent, controller):
+        super().__init__(parent, bg=controller.theme_colors["bg"])
+        self.controller = controller
+
 # --- NEW: ReportsPage Class ---
 class ReportsPage(BasePage):
     def __init__(self, parent, controller):
@@ -546,7 +2488,13 @@ class ReportsPage(BasePage):
             self.cal = Calendar(top_frame, selectmode='day', date_pattern='y-mm-dd')
             self.cal.pack(side="left", padx=10, fill="y")
             
+            # --- NEW: Per-device or combined report ---
+            self.device_var = tk.StringVar(value="All devices")
+            self.device_combo = ttk.Combobox(top_frame, textvariable=self.device_var, state="readonly", width=28)
+            self.device_combo.pack(side="left", padx=10)
+            
             tk.Button(top_frame, text="Show Report", command=self.show_report_for_date).pack(side="left", padx=10)
+            tk.Button(top_frame, text="Reload App Rules", command=self.reload_rules).pack(side="left", padx=10)
         else:
             tk.Label(top_frame, text="Please install 'tkcalendar' to use this feature.", fg="red").pack()
 
@@ -556,6 +2504,61 @@ class ReportsPage(BasePage):
         
         self.report_widgets = {}
         self.create_report_ui()
+        self.create_export_ui()
+
+    # --- NEW: Export controls ---
+    def create_export_ui(self):
+        export_frame = tk.Frame(self, bg=self.controller.theme_colors["bg"])
+        export_frame.pack(fill="x", pady=(10, 0))
+        
+        today_str = date.today().isoformat()
+        self.export_vars = {
+            'kind': tk.StringVar(value="events"), 'format': tk.StringVar(value="csv"),
+            'from': tk.StringVar(value=today_str), 'to': tk.StringVar(value=today_str),
+            'status': tk.StringVar(value=""),
+        }
+        tk.Label(export_frame, text="Export", font=self.controller.fonts["header"], bg=self.controller.theme_colors["bg"]).pack(side="left")
+        ttk.Combobox(export_frame, textvariable=self.export_vars['kind'], values=("events", "sessions"), state="readonly", width=9).pack(side="left", padx=5)
+        formats = EXPORT_FORMATS if PARQUET_ENABLED else EXPORT_FORMATS[:2]
+        ttk.Combobox(export_frame, textvariable=self.export_vars['format'], values=formats, state="readonly", width=8).pack(side="left", padx=5)
+        for label, key in (("From:", 'from'), ("To:", 'to')):
+            tk.Label(export_frame, text=label, font=self.controller.fonts["primary"], bg=self.controller.theme_colors["bg"]).pack(side="left")
+            tk.Entry(export_frame, textvariable=self.export_vars[key], width=11).pack(side="left", padx=5)
+        self.export_button = tk.Button(export_frame, text="Export...", command=self.start_export)
+        self.export_button.pack(side="left", padx=10)
+        tk.Label(export_frame, textvariable=self.export_vars['status'], font=self.controller.fonts["primary"], bg=self.controller.theme_colors["bg"]).pack(side="left")
+
+    def start_export(self):
+        kind, fmt = self.export_vars['kind'].get(), self.export_vars['format'].get()
+        start_day, end_day = self.export_vars['from'].get().strip(), self.export_vars['to'].get().strip()
+        try:
+            date.fromisoformat(start_day), date.fromisoformat(end_day)
+        except ValueError:
+            messagebox.showerror("Export", "Dates must be in YYYY-MM-DD format.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=f".{fmt}", initialfile=f"activity_{kind}_{start_day}_{end_day}.{fmt}")
+        if not path: return
+        
+        self.export_button.config(state="disabled")
+        self.export_vars['status'].set("Exporting...")
+        threading.Thread(target=self.run_export, args=(kind, fmt, start_day, end_day, path), daemon=True).start()
+
+    def run_export(self, kind, fmt, start_day, end_day, path):
+        root = self.controller.root
+        progress = lambda count: root.after(0, self.export_vars['status'].set, f"Exported {count:,} rows...")
+        try:
+            count = export_activity(kind, fmt, start_day, end_day, path, self.controller.device_id,
+                                    self.controller.classifier, progress)
+            root.after(0, self.export_vars['status'].set, f"Exported {count:,} rows to {os.path.basename(path)}")
+        except Exception as e:
+            root.after(0, self.export_vars['status'].set, "Export failed")
+            root.after(0, messagebox.showerror, "Export", f"Export failed: {e}")
+        finally:
+            root.after(0, self.export_button.config, {"state": "normal"})
+
+    def on_show(self):
+        if CALENDAR_ENABLED:
+            self.device_combo['values'] = ["All devices"] + self.controller.get_devices()
 
     def create_report_ui(self):
         # This UI will be populated with data for the selected date
@@ -572,10 +2575,64 @@ class ReportsPage(BasePage):
         self.create_stat_display(stats_frame, "Idle Time", self.report_widgets['idle_var']).pack(side="left", expand=True)
         
         tk.Label(self.report_frame, text="Top Applications", font=self.controller.fonts["header"], bg="white").pack(pady=(20, 5))
-        self.report_widgets['app_tree'] = ttk.Treeview(self.report_frame, columns=("App", "Time"), show="headings", height=10)
+        self.report_widgets['app_tree'] = ttk.Treeview(self.report_frame, columns=("App", "Category", "Time"), show="headings", height=6)
         self.report_widgets['app_tree'].heading("App", text="Application")
+        self.report_widgets['app_tree'].heading("Category", text="Category")
         self.report_widgets['app_tree'].heading("Time", text="Usage")
         self.report_widgets['app_tree'].pack(fill="x", padx=20, pady=10)
+        
+        self.create_heatmap_ui()
+
+    # --- NEW: Weekday x hour heatmap ---
+    def create_heatmap_ui(self):
+        controls = tk.Frame(self.report_frame, bg="white")
+        controls.pack(fill="x", padx=20)
+        tk.Label(controls, text="Activity Heatmap", font=self.controller.fonts["header"], bg="white").pack(side="left")
+        self.heatmap_range_var = tk.StringVar(value="Last 30 days")
+        self.heatmap_state_var = tk.StringVar(value="active")
+        ttk.Combobox(controls, textvariable=self.heatmap_range_var, values=list(HEATMAP_RANGES), state="readonly", width=14).pack(side="left", padx=10)
+        ttk.Combobox(controls, textvariable=self.heatmap_state_var, values=("active", "idle"), state="readonly", width=7).pack(side="left")
+        tk.Button(controls, text="Show Heatmap", command=self.draw_heatmap).pack(side="left", padx=10)
+        self.heatmap_info_var = tk.StringVar(value="")
+        tk.Label(controls, textvariable=self.heatmap_info_var, font=self.controller.fonts["primary"], bg="white").pack(side="left")
+        
+        cell_w, cell_h = HEATMAP_CELL
+        self.heatmap_canvas = tk.Canvas(self.report_frame, bg="white", highlightthickness=0,
+                                        width=HEATMAP_LEFT + 24 * cell_w, height=HEATMAP_TOP + 7 * cell_h)
+        self.heatmap_canvas.pack(padx=20, pady=10, anchor="w")
+        # Cells are created once; redraws only change their fill
+        self.heatmap_cells = []
+        for hour in range(0, 24, 3):
+            self.heatmap_canvas.create_text(HEATMAP_LEFT + hour * cell_w, 8, text=f"{hour:02d}", anchor="w", font=self.controller.fonts["primary"])
+        for weekday, name in enumerate(WEEKDAY_NAMES):
+            y = HEATMAP_TOP + weekday * cell_h
+            self.heatmap_canvas.create_text(4, y + cell_h / 2, text=name, anchor="w", font=self.controller.fonts["primary"])
+            self.heatmap_cells.append([self.heatmap_canvas.create_rectangle(
+                HEATMAP_LEFT + hour * cell_w, y, HEATMAP_LEFT + (hour + 1) * cell_w - 1, y + cell_h - 1,
+                fill="#FFFFFF", outline="#EEEEEE") for hour in range(24)])
+
+    def draw_heatmap(self):
+        started = time.perf_counter()
+        days = HEATMAP_RANGES[self.heatmap_range_var.get()]
+        end_day = date.today()
+        start_day = end_day - timedelta(days=days - 1)
+        device = self.device_var.get() if CALENDAR_ENABLED and self.device_var.get() != "All devices" else None
+        grid = self.controller.heatmap_cache.weekday_hour_grid(start_day.isoformat(), end_day.isoformat(),
+                                                               self.heatmap_state_var.get(), device)
+        
+        peak = max(max(row) for row in grid)
+        accent = self.controller.theme_colors["accent"]
+        for weekday, row in enumerate(grid):
+            for hour, seconds in enumerate(row):
+                fill = blend_color("#FFFFFF", accent, seconds / peak) if peak else "#FFFFFF"
+                self.heatmap_canvas.itemconfig(self.heatmap_cells[weekday][hour], fill=fill)
+        
+        info = f"drawn in {(time.perf_counter() - started) * 1000:.0f} ms"
+        if peak:
+            weekday, hour = max(((w, h) for w in range(7) for h in range(24)), key=lambda wh: grid[wh[0]][wh[1]])
+            peak_str = self.controller.pages["Dashboard"].format_time(peak)
+            info = f"Peak: {WEEKDAY_NAMES[weekday]} {hour:02d}:00 ({peak_str}), " + info
+        self.heatmap_info_var.set(info)
 
     def create_stat_display(self, parent, title, string_var):
         frame = tk.Frame(parent, bg="white")
@@ -583,53 +2640,28 @@ class ReportsPage(BasePage):
         tk.Label(frame, textvariable=string_var, font=self.controller.fonts["card_value"], bg="white", fg=self.controller.theme_colors["accent"]).pack()
         return frame
 
+    def reload_rules(self):
+        self.controller.reload_classification_rules()
+        self.show_report_for_date()
+
     def show_report_for_date(self):
         selected_date_str = self.cal.get_date()
-        self.report_widgets['date_label'].config(text=f"Report for: {selected_date_str}")
+        selected_device = self.device_var.get()
+        if selected_device == "All devices": selected_device = None
+        self.report_widgets['date_label'].config(text=f"Report for: {selected_date_str}" + (f" ({selected_device})" if selected_device else ""))
         
-        # Filter data for the selected date
-        selected_date_logs = [entry for entry in self.controller.data if entry.get('time', '').startswith(selected_date_str)]
+        # Stats come from the shared session engine
+        active_s, idle_s = self.controller.session_engine.day_totals(selected_date_str, selected_device)
+        app_usage = self.controller.session_engine.app_totals(selected_date_str, selected_device)
         
-        if not selected_date_logs:
+        if not active_s and not idle_s:
             self.report_widgets['active_var'].set("0h 0m")
             self.report_widgets['idle_var'].set("0h 0m")
             for i in self.report_widgets['app_tree'].get_children():
                 self.report_widgets['app_tree'].delete(i)
-            self.report_widgets['app_tree'].insert("", "end", values=("No activity recorded on this day.", ""))
+            self.report_widgets['app_tree'].insert("", "end", values=("No activity recorded on this day.", "", ""))
             return
 
-        # Calculate stats for the selected date
-        active_s, idle_s = 0, 0
-        app_usage = defaultdict(float)
-        last_time = None
-        last_state_idle = False
-        last_app_title = None
-        last_app_start = None
-
-        for entry in selected_date_logs:
-            current_time = datetime.fromisoformat(entry['time'])
-            
-            if last_time:
-                duration = (current_time - last_time).total_seconds()
-                if duration < 1800: # Ignore large gaps
-                    if last_state_idle:
-                        idle_s += duration
-                    else:
-                        active_s += duration
-                    if last_app_title:
-                        app_usage[last_app_title] += duration
-
-            if entry['type'] == 'activity':
-                if 'User is Idle' in entry['event']:
-                    last_state_idle = True
-                elif 'User is Active' in entry['event']:
-                    last_state_idle = False
-            
-            if entry['type'] == 'window':
-                last_app_title = entry['event'].replace("Switched to: ", "")
-            
-            last_time = current_time
-
         # Update UI
         self.report_widgets['active_var'].set(self.controller.pages["Dashboard"].format_time(active_s))
         self.report_widgets['idle_var'].set(self.controller.pages["Dashboard"].format_time(idle_s))
@@ -641,7 +2673,7 @@ class ReportsPage(BasePage):
         for app, duration in sorted_apps[:10]:
             app_name = (app[:50] + '...') if len(app) > 50 else app
             time_str = self.controller.pages["Dashboard"].format_time(duration)
-            self.report_widgets['app_tree'].insert("", "end", values=(app_name, time_str))
+            self.report_widgets['app_tree'].insert("", "end", values=(app_name, self.controller.classifier.category_of(app), time_str))
 
 # --- Other Page Classes (Dashboard, Logs, etc.) remain largely the same ---
 # ... (Paste the existing DashboardPage, LogsPage, SystemInfoPage, AboutPage classes here)
@@ -679,7 +2711,7 @@ class DashboardPage(BasePage):
             self.ai_button.config(state="disabled")
             self.update_ai_response("AI feature disabled. Please install 'google-generativeai' and add your API Key in the code.")
         
-        self.update_stats()
+        self.scheduler = RenderScheduler(controller.root, controller.stats_key, self.update_stats, interval_ms=2000)
 
     def create_stat_card(self, parent, title, string_var):
         frame = tk.Frame(parent, bg=self.controller.theme_colors["frame"], relief="solid", borderwidth=1, highlightbackground="#E0E0E0")
@@ -695,11 +2727,15 @@ class DashboardPage(BasePage):
         elif m > 0: return f"{m}m {s}s"
         else: return f"{s}s"
 
+    def set_stat(self, name, value):
+        if self.stat_vars[name].get() != value:
+            self.stat_vars[name].set(value)
+
     def update_stats(self):
         self.controller.pre_calculate_today_stats() # Recalculate for live update
-        self.stat_vars["active"].set(self.format_time(self.controller.active_time_seconds))
-        self.stat_vars["idle"].set(self.format_time(self.controller.idle_time_seconds))
-        self.stat_vars["clicks"].set(f"{self.controller.mouse_clicks}")
+        self.set_stat("active", self.format_time(self.controller.active_time_seconds))
+        self.set_stat("idle", self.format_time(self.controller.idle_time_seconds))
+        self.set_stat("clicks", f"{self.controller.mouse_clicks}")
 
         if self.controller.app_usage:
             top_app_name = max(self.controller.app_usage, key=self.controller.app_usage.get)
@@ -707,9 +2743,9 @@ class DashboardPage(BasePage):
             
             top_app_display_name = (top_app_name[:20] + '...') if len(top_app_name) > 20 else top_app_name
             top_app_display_time = self.format_time(top_app_duration)
-            self.stat_vars["top_app"].set(f"{top_app_display_name}\n{top_app_display_time}")
+            self.set_stat("top_app", f"{top_app_display_name}\n{top_app_display_time}")
         else:
-            self.stat_vars["top_app"].set("N/A")
+            self.set_stat("top_app", "N/A")
 
     def update_ai_response(self, text):
         self.ai_response_text.config(state="normal")
@@ -782,11 +2818,22 @@ class LogsPage(BasePage):
         self.detail_tree.column("Event", width=450, anchor='w')
         self.detail_tree.pack(fill=tk.BOTH, expand=True)
         paned_window.add(detail_frame)
+        
+        # Redrawn only on new events, and only while visible
+        self.scheduler = RenderScheduler(controller.root, self.render_key, self.refresh_if_visible)
+        self.scheduler.start()
+
+    def render_key(self):
+        return (self.controller.stats_key(), self.winfo_ismapped())
+
+    def refresh_if_visible(self):
+        if self.winfo_ismapped(): self.on_show()
 
     def on_show(self):
         for i in self.summary_tree.get_children(): self.summary_tree.delete(i)
         for i in self.detail_tree.get_children(): self.detail_tree.delete(i)
 
+        self.controller.pre_calculate_today_stats()
         app_usage = self.controller.app_usage
         sorted_apps = sorted(app_usage.items(), key=lambda item: item[1], reverse=True)
 
@@ -817,11 +2864,13 @@ class LogsPage(BasePage):
             if not entry['time'].startswith(today_str): continue
             
             event_desc = entry['event']
+            is_switch = event_desc.startswith("Switched to: ")
             
-            if event_desc == f"Switched to: {full_app_name}":
+            # Titles are grouped by their canonical app, so "a.py - VS Code" and "b.py - VS Code" both match
+            if is_switch and self.controller.classifier.classify(event_desc[len("Switched to: "):], entry.get('process'))[0] == full_app_name:
                 is_app_active = True
                 self.add_detail_entry(entry)
-            elif event_desc.startswith("Switched to:") and is_app_active:
+            elif is_switch and is_app_active:
                 is_app_active = False
                 switched_away_entry = entry.copy()
                 switched_away_entry['event'] = f"--- Switched away to another app ---"
@@ -835,6 +2884,70 @@ class LogsPage(BasePage):
         self.detail_tree.tag_configure("away", foreground="gray")
         self.detail_tree.yview_moveto(1)
 
+# --- NEW: SearchPage Class ---
+class SearchPage(BasePage):
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        
+        search_frame = tk.Frame(self, bg=self.controller.theme_colors["bg"])
+        search_frame.pack(fill="x", pady=(0, 10))
+        
+        self.query_var = tk.StringVar()
+        self.from_var = tk.StringVar()
+        self.to_var = tk.StringVar()
+        
+        query_entry = tk.Entry(search_frame, textvariable=self.query_var, font=self.controller.fonts["primary"], width=40)
+        query_entry.pack(side="left", padx=(0, 10))
+        query_entry.bind("<Return>", lambda e: self.run_search())
+        for label, var in (("From (YYYY-MM-DD):", self.from_var), ("To:", self.to_var)):
+            tk.Label(search_frame, text=label, font=self.controller.fonts["primary"], bg=self.controller.theme_colors["bg"]).pack(side="left")
+            tk.Entry(search_frame, textvariable=var, font=self.controller.fonts["primary"], width=12).pack(side="left", padx=5)
+        tk.Button(search_frame, text="Search", command=self.run_search).pack(side="left", padx=10)
+        
+        self.status_var = tk.StringVar(value="Search window titles and copied text. Double-click a copy to restore it.")
+        tk.Label(self, textvariable=self.status_var, font=self.controller.fonts["primary"], bg=self.controller.theme_colors["bg"]).pack(anchor="w")
+        
+        self.results_tree = ttk.Treeview(self, columns=("Time", "Device", "Event"), show="headings")
+        self.results_tree.heading("Time", text="Timestamp")
+        self.results_tree.heading("Device", text="Device")
+        self.results_tree.heading("Event", text="Event Details")
+        self.results_tree.column("Time", width=150, anchor='w')
+        self.results_tree.column("Device", width=120, anchor='w')
+        self.results_tree.column("Event", width=550, anchor='w')
+        self.results_tree.pack(fill="both", expand=True, pady=10)
+        self.results_tree.bind("<Double-1>", self.restore_clip)
+        self.result_clips = {}
+
+    def run_search(self):
+        for i in self.results_tree.get_children(): self.results_tree.delete(i)
+        self.result_clips.clear()
+        start_day, end_day = self.from_var.get().strip() or None, self.to_var.get().strip() or None
+        for day in (start_day, end_day):
+            if day:
+                try:
+                    date.fromisoformat(day)
+                except ValueError:
+                    self.status_var.set(f"Invalid date: {day}")
+                    return
+        
+        results, elapsed_ms = self.controller.search_index.search(self.query_var.get(), start_day, end_day)
+        for event_time, device, _, event, clip in results:
+            time_str = datetime.fromisoformat(event_time).strftime('%Y-%m-%d %H:%M:%S')
+            item = self.results_tree.insert("", "end", values=(time_str, device or "", event))
+            if clip: self.result_clips[item] = clip
+        self.status_var.set(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
+    def restore_clip(self, event):
+        """Double-click a copied item to put its full text back on the clipboard."""
+        clip = self.result_clips.get(self.results_tree.focus())
+        if not clip or not CLIPBOARD_ENABLED: return
+        text = self.controller.clipboard_store.get(clip)
+        if text is None:
+            self.status_var.set("That clip has been evicted from the clipboard history.")
+            return
+        pyperclip.copy(text)
+        self.status_var.set(f"Copied {len(text):,} characters back to the clipboard.")
+
 class SystemInfoPage(BasePage):
     def __init__(self, parent, controller):
         super().__init__(parent, controller)
@@ -855,12 +2968,30 @@ class SystemInfoPage(BasePage):
                 specs += f"RAM: {ram.total / (1024**3):.2f} GB\n"
             except:
                 specs += "RAM: N/A\n"
+            specs += self.resource_summary()
 
         self.info_text.config(state="normal")
         self.info_text.delete(1.0, "end")
         self.info_text.insert("end", specs)
         self.info_text.config(state="disabled")
 
+    def resource_summary(self):
+        sampler = self.controller.resource_sampler
+        if self.controller.collector_link:
+            return f"\nForeground app resources are sampled by the collector daemon ({RESOURCES_FILE}).\n"
+        if not sampler: return ""
+        text = f"\n--- Foreground App Resources (every {sampler.interval}s, sampler overhead {sampler.overhead():.2%}) ---\n"
+        if sampler.history:
+            sample_time, app, cpu, rss = sampler.history[-1]
+            text += f"Now: {app}  CPU {cpu:.1f}%  RAM {rss:.0f} MB  ({sample_time[11:]})\n\n"
+        averages = sampler.app_averages(date.today().isoformat())
+        if not averages: return text + "No recent samples today.\n"
+        text += f"Averages over today's samples among the last {sampler.history.maxlen} kept in memory:\n"
+        text += f"{'Application':<30}{'Avg CPU':>10}{'Avg RAM':>12}{'Samples':>9}\n"
+        for app, (cpu, rss, n) in sorted(averages.items(), key=lambda item: item[1][0], reverse=True)[:10]:
+            text += f"{app[:29]:<30}{cpu:>9.1f}%{rss:>9.0f} MB{n:>9}\n"
+        return text
+
 class AboutPage(BasePage):
     def __init__(self, parent, controller):
         super().__init__(parent, controller)
@@ -881,7 +3012,276 @@ class AboutPage(BasePage):
         link.pack(side="left", padx=5)
         link.bind("<Button-1>", lambda e: webbrowser.open_new(url))
 
+# --- NEW: Accelerated replay harness ---
+FRAME_PROBE_MS = 50 # How often the GUI replay checks Tk's event loop lag
+SYNTHETIC_WINDOWS = [
+    WindowInfo("main.py - project - Visual Studio Code", None, None, "Code.exe"),
+    WindowInfo("Inbox - Gmail - Google Chrome", None, None, "chrome.exe"),
+    WindowInfo("python - Stack Overflow - Google Chrome", None, None, "chrome.exe"),
+    WindowInfo("general - Slack", None, None, "slack.exe"),
+    WindowInfo("Terminal", None, None, "WindowsTerminal.exe"),
+    WindowInfo("Quarterly report - Word", None, None, "WINWORD.EXE"),
+    WindowInfo("Budget.xlsx - Excel", None, None, "EXCEL.EXE"),
+    WindowInfo("Spotify Premium", None, None, "Spotify.exe"),
+]
+
+class VirtualClock:
+    """Replay clock: jumps from stimulus to stimulus, paced at `speed` times real time (0 = unpaced)."""
+    def __init__(self, start, speed):
+        self.start = self.current = start
+        self.speed = speed
+        self.real_start = time.perf_counter()
+
+    def time(self): return self.current
+    def now(self): return datetime.fromtimestamp(self.current)
+    def sleep(self, seconds): self.advance_to(self.current + seconds)
+
+    async def wait(self, seconds):
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def advance_to(self, timestamp):
+        if self.speed:
+            delay = self.real_start + (timestamp - self.start) / self.speed - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+        self.current = max(self.current, timestamp)
+
+def window_from_entry(entry):
+    return WindowInfo(str(entry.get('event', ''))[len("Switched to: "):], None, entry.get('exe'), entry.get('process'))
+
+def replay_stimuli_from_log(path):
+    """Turns a recorded log back into (time, kind, value) inputs for the collector."""
+    entries = [e for e in iter_log_file(path) if e.get('type') in ('window', 'activity', 'clipboard') and 'time' in e]
+    entries.sort(key=lambda e: e['time'])
+    stimuli = []
+    for i, entry in enumerate(entries):
+        ts = datetime.fromisoformat(entry['time']).timestamp()
+        event = str(entry.get('event', ''))
+        if entry['type'] == 'window' and event.startswith("Switched to: "):
+            stimuli.append((ts, 'window', window_from_entry(entry)))
+        elif entry['type'] == 'clipboard':
+            stimuli.append((ts, 'clipboard', (event, entry.get('clip'))))
+        elif event.endswith("Idle"):
+            stimuli.append((ts, 'idle', None))
+        elif event.endswith("Active"):
+            # The collector re-announces the window on wake-up, so resume straight into it
+            nxt = entries[i + 1] if i + 1 < len(entries) else {}
+            stimuli.append((ts, 'input', window_from_entry(nxt) if nxt.get('type') == 'window' else None))
+    return stimuli
+
+def synthetic_stimuli(hours, seed=0, idle_threshold=300):
+    """A reproducible working day from 08:00 today: window switches, clicks, copies and breaks."""
+    rng = random.Random(seed)
+    t = datetime.combine(date.today(), datetime.min.time()).timestamp() + 8 * 3600
+    end = t + hours * 3600
+    stimuli = []
+    while t < end:
+        roll = rng.random()
+        if roll < 0.005: # A break: the collector notices once the idle threshold has passed
+            stimuli.append((t + idle_threshold, 'idle', None))
+            t += idle_threshold + rng.uniform(60, 1800)
+            stimuli.append((t, 'input', rng.choice(SYNTHETIC_WINDOWS)))
+        elif roll < 0.25:
+            stimuli.append((t, 'window', rng.choice(SYNTHETIC_WINDOWS)))
+        elif roll < 0.28:
+            stimuli.append((t, 'clipboard', (f'Copied: "snippet {rng.randrange(10000)}"', None)))
+        else:
+            stimuli.append((t, 'click', None))
+        t += rng.expovariate(1 / 4) # About one input every 4 seconds
+    return stimuli
+
+def current_memory_mb():
+    return psutil.Process().memory_info().rss / 1e6 if SPECS_ENABLED else None
+
+class ReplayCollector(ActivityCollector):
+    """Feeds recorded or synthetic inputs through the collector's own probe loop on the virtual clock.
+
+    probe_stimuli runs first in every wakeup and applies the inputs due by
+    then, the way the OS would between two probes; the real activity and
+    clipboard probes, batching and flush then do the rest.
+    """
+    def __init__(self, config, stimuli):
+        super().__init__(config)
+        self.stimuli = stimuli
+        self.next_stimulus = 0
+        self.clips = deque() # Copies waiting for the next clipboard probe
+        self.window = WindowInfo(None, None, None, None)
+        self.finished = threading.Event()
+        self.memory_by_hour = []
+        self.max_queue_depth = 0
+
+    def scheduler(self):
+        scheduler = ProbeScheduler()
+        scheduler.add(ACTIVITY_PROBE_INTERVAL, self.probe_stimuli)
+        scheduler.add(ACTIVITY_PROBE_INTERVAL, self.probe_activity)
+        scheduler.add(CLIPBOARD_PROBE_INTERVAL, self.probe_clipboard) # Replayed clips don't need pyperclip
+        return scheduler
+
+    def run_probes(self):
+        super().run_probes()
+        self.finished.set()
+
+    def probe_window(self):
+        return self.window
+
+    def check_clipboard(self):
+        while self.clips:
+            event, clip = self.clips.popleft()
+            self.emit('clipboard', event, **({'clip': clip} if clip else {}))
+
+    async def probe_stimuli(self):
+        global last_activity_time
+        threshold = self.config.get('idle_threshold_minutes', 5) * 60
+        first, now = self.stimuli[0][0], clock.time()
+        while self.next_stimulus < len(self.stimuli) and self.stimuli[self.next_stimulus][0] <= now:
+            ts, kind, value = self.stimuli[self.next_stimulus]
+            self.next_stimulus += 1
+            while len(self.memory_by_hour) <= (ts - first) // 3600:
+                self.memory_by_hour.append(current_memory_mb())
+            self.max_queue_depth = max(self.max_queue_depth, event_queue.qsize())
+            if kind == 'clipboard':
+                self.clips.append(value)
+            elif kind == 'idle':
+                last_activity_time = min(last_activity_time, ts - threshold - 1)
+            else:
+                last_activity_time = ts
+                if kind == 'click': event_queue.put(('click', None))
+                if value: self.window = value
+        if self.next_stimulus == len(self.stimuli) and not self.clips:
+            self.running = False # The rest of this wakeup still runs, so the last inputs are captured
+
+def probe_frame_latency(root, lags):
+    """Records how late each FRAME_PROBE_MS tick runs, i.e. how long the UI was blocked."""
+    expected = time.perf_counter() + FRAME_PROBE_MS / 1000
+    def tick():
+        nonlocal expected
+        now = time.perf_counter()
+        lags.append(max(0.0, (now - expected) * 1000))
+        expected = now + FRAME_PROBE_MS / 1000
+        root.after(FRAME_PROBE_MS, tick)
+    root.after(FRAME_PROBE_MS, tick)
+
+def run_replay(args):
+    """--replay/--synthetic: drives the real ingestion path and prints a JSON summary."""
+    global clock
+    scratch = os.environ.get('ACTIVITY_LOGGER_SCRATCH')
+    if not scratch:
+        # Re-run in a scratch home and working directory so the real log, sessions,
+        # search index and Drive token are never touched
+        scratch = tempfile.mkdtemp(prefix='activity_replay_')
+        cmd = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(__file__)]
+        if args.replay:
+            cmd += ['--replay', os.path.abspath(os.path.expanduser(args.replay))]
+        else:
+            cmd += ['--synthetic', str(args.synthetic), '--seed', str(args.seed)]
+        cmd += ['--speed', str(args.speed)] + (['--gui'] if args.gui else [])
+        env = dict(os.environ, HOME=scratch, USERPROFILE=scratch, ACTIVITY_LOGGER_SCRATCH=scratch)
+        try:
+            return subprocess.run(cmd, env=env, cwd=scratch).returncode
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    stimuli = replay_stimuli_from_log(args.replay) if args.replay else synthetic_stimuli(args.synthetic, args.seed)
+    if not stimuli:
+        print("Nothing to replay.")
+        return 1
+    clock = VirtualClock(stimuli[0][0], args.speed)
+    frame_lags = []
+    started = time.perf_counter()
+    if args.gui:
+        root = tk.Tk()
+        # A replay never attaches to the live daemon
+        app = ActivityLoggerApp(root, collector=ReplayCollector({'idle_threshold_minutes': 5}, stimuli), attach_to_daemon=False)
+        collector = app.collector
+        probe_frame_latency(root, frame_lags)
+        def finish_when_drained():
+            # Runs on the Tk thread, so an empty queue means every event has been ingested
+            if collector.finished.is_set() and event_queue.empty():
+                app.quit_app()
+            else:
+                root.after(100, finish_when_drained)
+        root.after(100, finish_when_drained)
+        root.mainloop()
+        wall_seconds = time.perf_counter() - started
+    else:
+        daemon = CollectorDaemon()
+        collector = daemon.collector = ReplayCollector(daemon.config, stimuli)
+        pump = threading.Thread(target=daemon.pump, daemon=True)
+        pump.start()
+        collector.start()
+        collector.finished.wait()
+        while not event_queue.empty(): time.sleep(0.001)
+        wall_seconds = time.perf_counter() - started
+        daemon.running = False
+        pump.join() # Finishes the last write, then waits out pump()'s queue timeout
+
+    events = sum(1 for _ in iter_log_file(LOG_FILE))
+    virtual_seconds = stimuli[-1][0] - stimuli[0][0]
+    frame_lags.sort()
+    summary = {
+        'source': args.replay or f"synthetic:{args.synthetic}h:seed{args.seed}",
+        'mode': 'gui' if args.gui else 'headless',
+        'stimuli': len(stimuli),
+        'events_written': events,
+        'virtual_hours': round(virtual_seconds / 3600, 2),
+        'wall_seconds': round(wall_seconds, 3),
+        'speedup': round(virtual_seconds / wall_seconds, 1) if wall_seconds else None,
+        'ingest_events_per_sec': round(events / wall_seconds, 1) if wall_seconds else None,
+        'max_queue_depth': collector.max_queue_depth,
+        'frame_latency_ms': {
+            'mean': round(sum(frame_lags) / len(frame_lags), 2),
+            'p95': round(frame_lags[int(len(frame_lags) * 0.95)], 2),
+            'max': round(frame_lags[-1], 2),
+        } if frame_lags else None,
+        'memory_mb': {
+            'by_hour': [round(m, 1) for m in collector.memory_by_hour] if SPECS_ENABLED else None,
+            'end': round(current_memory_mb(), 1) if SPECS_ENABLED else None,
+        },
+    }
+    print(json.dumps(summary, indent=2))
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Activity Logger")
+    parser.add_argument('--benchmark-load', metavar='LOG', help="parse a JSONL log and report lines/sec, then exit")
+    parser.add_argument('--collector', action='store_true', help="run the headless collector daemon (no GUI)")
+    parser.add_argument('--replay', metavar='LOG', help="replay a recorded log through the collector and report throughput")
+    parser.add_argument('--synthetic', type=float, metavar='HOURS', help="replay a generated day of HOURS hours instead of a log")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for --synthetic")
+    parser.add_argument('--speed', type=float, default=1000, help="replay speed in times real time (0 = as fast as possible)")
+    parser.add_argument('--gui', action='store_true', help="attach the GUI during a replay")
+    parser.add_argument('--benchmark-sampler', type=int, metavar='N', help="time N resource samples against the overhead budget, then exit")
+    parser.add_argument('--export', choices=('events', 'sessions'), help="export data without starting the GUI")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', help="export file format")
+    parser.add_argument('--from', dest='from_day', default=date.today().isoformat(), help="first day to export (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='to_day', default=date.today().isoformat(), help="last day to export (YYYY-MM-DD)")
+    parser.add_argument('--out', help="export output file")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
+    if args.benchmark_load:
+        size_mb = os.path.getsize(args.benchmark_load) / (1024**2) if os.path.exists(args.benchmark_load) else 0
+        entries, rate = parse_jsonl_file(args.benchmark_load)
+        print(f"{len(entries)} entries ({size_mb:.1f} MB), {rate:,.0f} entries/sec, orjson={'yes' if ORJSON_ENABLED else 'no'}")
+        raise SystemExit(0)
+    if args.collector:
+        CollectorDaemon().serve_forever()
+        raise SystemExit(0)
+    if args.replay or args.synthetic:
+        raise SystemExit(run_replay(args))
+    if args.benchmark_sampler:
+        if not SPECS_ENABLED:
+            print("Resource sampling needs 'psutil'.")
+            raise SystemExit(2)
+        raise SystemExit(0 if benchmark_sampler(args.benchmark_sampler) else 1)
+    if args.export:
+        out = args.out or f"activity_{args.export}_{args.from_day}_{args.to_day}.{args.format}"
+        count = export_activity(args.export, args.format, args.from_day, args.to_day, out,
+                                progress=lambda n: print(f"Exported {n:,} rows...", end='\r'))
+        print(f"\nWrote {count:,} rows to {out}")
+        raise SystemExit(0)
+
     root = tk.Tk()
     # To start the app hidden in the tray, uncomment the next line
     # root.withdraw() 
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import activity_logger
+
+
+class FakeClock:
+    """Only moves when the scheduler waits or a probe stalls."""
+    def __init__(self):
+        self.current = 0.0
+
+    def time(self): return self.current
+    def sleep(self, seconds): self.current += seconds
+
+    async def wait(self, seconds):
+        self.current += seconds
+
+
+def run_scheduler(monkeypatch, probes, until, slack=activity_logger.PROBE_SLACK):
+    """Runs (interval, probe) pairs until the fake clock reaches `until`; returns the scheduler and its wakeup times."""
+    fake = FakeClock()
+    monkeypatch.setattr(activity_logger, 'clock', fake)
+    scheduler = activity_logger.ProbeScheduler(slack)
+    for interval, probe in probes:
+        scheduler.add(interval, probe)
+    wakes = []
+    asyncio.run(scheduler.run(lambda: fake.time() < until, lambda: wakes.append(fake.time())))
+    return scheduler, wakes
+
+
+def recorder(runs):
+    async def probe():
+        runs.append(activity_logger.clock.time())
+    return probe
+
+
+def test_probe_runs_on_its_interval(monkeypatch):
+    runs = []
+    scheduler, wakes = run_scheduler(monkeypatch, [(1.0, recorder(runs))], until=5)
+    assert runs == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert wakes == runs
+    assert scheduler.wakeups == 5
+
+
+def test_probes_due_within_slack_share_a_wakeup(monkeypatch):
+    fast, slow = [], []
+    scheduler, wakes = run_scheduler(monkeypatch, [(1.0, recorder(fast)), (1.2, recorder(slow))], until=3)
+    # Due at 1.2, within the slack of the 1.0 wakeup, so it runs early instead of waking again;
+    # it stays on its own grid, so 2.4 is outside the slack of the 2.0 wakeup
+    assert fast == [0.0, 1.0, 2.0]
+    assert slow == pytest.approx([0.0, 1.0, 2.4])
+    assert wakes == pytest.approx([0.0, 1.0, 2.0, 2.4])
+    assert scheduler.wakeups == 4
+
+
+def test_probes_outside_slack_wake_separately(monkeypatch):
+    fast, slow = [], []
+    scheduler, wakes = run_scheduler(monkeypatch, [(1.0, recorder(fast)), (1.5, recorder(slow))], until=2)
+    assert fast == [0.0, 1.0]
+    assert slow == [0.0, 1.5]
+    assert wakes == [0.0, 1.0, 1.5]
+
+
+def test_missed_runs_are_skipped_after_a_stall(monkeypatch):
+    runs = []
+
+    async def stalling_probe():
+        runs.append(activity_logger.clock.time())
+        if len(runs) == 3:
+            activity_logger.clock.sleep(5.5) # e.g. the machine was suspended mid-probe
+
+    run_scheduler(monkeypatch, [(1.0, stalling_probe)], until=10)
+    # The runs due at 3..7 while stalled collapse into one at 7.5, then the grid restarts from there
+    assert runs == [0.0, 1.0, 2.0, 7.5, 8.5, 9.5]
+
+
+def test_a_failing_probe_keeps_its_schedule(monkeypatch, capsys):
+    runs = []
+
+    async def failing_probe():
+        runs.append(activity_logger.clock.time())
+        raise RuntimeError("no display")
+
+    run_scheduler(monkeypatch, [(1.0, failing_probe)], until=3)
+    assert runs == [0.0, 1.0, 2.0]
+    assert "no display" in capsys.readouterr().out
+
+
+def test_replay_goes_through_the_probe_loop(monkeypatch):
+    start = 1_000_000.0
+    monkeypatch.setattr(activity_logger, 'clock', activity_logger.VirtualClock(start, 0))
+    monkeypatch.setattr(activity_logger, 'last_activity_time', start)
+    monkeypatch.setattr(activity_logger, 'event_queue', activity_logger.queue.Queue())
+    stimuli = [
+        (start, 'window', activity_logger.WindowInfo("a", None, None, None)),
+        (start + 3, 'clipboard', ('Copied: "x"', None)),
+        (start + 5, 'window', activity_logger.WindowInfo("b", None, None, None)),
+    ]
+    collector = activity_logger.ReplayCollector({'idle_threshold_minutes': 5}, stimuli)
+    collector.running = True
+    collector.run_probes()
+    items = []
+    while not activity_logger.event_queue.empty():
+        items.append(activity_logger.event_queue.get())
+    assert collector.finished.is_set()
+    assert {kind for kind, _ in items} == {'batch'}
+    events = [(event[0], event[1]) for _, batch in items for event in batch]
+    assert events == [('window', "Switched to: a"), ('clipboard', 'Copied: "x"'), ('window', "Switched to: b")]
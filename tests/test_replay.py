@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+import tkinter
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'activity_logger.py')
+
+# Loose floors: a regression that puts blocking work back on the capture path misses them by orders of magnitude
+MIN_SPEEDUP = 2000
+MIN_EVENTS = 100
+
+
+def run_replay(*args, timeout=300):
+    """Runs the replay harness in its own process; returns the JSON summary it prints last."""
+    result = subprocess.run([sys.executable, SCRIPT, '--speed', '0', *args],
+                            capture_output=True, text=True, timeout=timeout)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout[result.stdout.index('{\n'):])
+
+
+def has_display():
+    try:
+        tkinter.Tk().destroy()
+        return True
+    except tkinter.TclError:
+        return False
+
+
+def test_headless_replay_throughput():
+    summary = run_replay('--synthetic', '2')
+    assert summary['mode'] == 'headless'
+    assert summary['events_written'] >= MIN_EVENTS
+    assert summary['speedup'] >= MIN_SPEEDUP
+
+
+@pytest.mark.skipif(not has_display(), reason="needs a display for Tk")
+def test_gui_replay_finishes_and_reports_frame_latency():
+    summary = run_replay('--synthetic', '0.5', '--gui', timeout=120)
+    assert summary['mode'] == 'gui'
+    assert summary['events_written'] > 0
+    assert summary['frame_latency_ms'] is not None
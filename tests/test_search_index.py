@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import activity_logger
+
+
+def clip(time, text, digest):
+    return {'time': time, 'type': 'clipboard', 'event': f'Copied: "{text}"', 'clip': digest, 'device': 'A'}
+
+
+def found(index, query):
+    return sorted(row[3] for row in index.search(query)[0])
+
+
+def test_clips_copied_in_the_same_second_are_all_indexed(tmp_path):
+    index = activity_logger.SearchIndex(str(tmp_path / 'search.db'))
+    index.add(clip('2024-01-01T10:00:00', 'alpha', 'a' * 64))
+    index.add(clip('2024-01-01T10:00:00', 'beta', 'b' * 64))
+    assert found(index, 'alpha') == ['Copied: "alpha"']
+    assert found(index, 'beta') == ['Copied: "beta"']
+    index.close()
+
+
+def test_the_same_event_is_indexed_once(tmp_path):
+    index = activity_logger.SearchIndex(str(tmp_path / 'search.db'))
+    window = {'time': '2024-01-01T10:00:00', 'type': 'window', 'event': 'Switched to: Code', 'device': 'A'}
+    index.add(window)
+    index.catch_up([window, dict(window)])
+    assert found(index, 'Code') == ['Switched to: Code']
+    index.close()
+
+
+def test_old_identity_index_is_replaced(tmp_path):
+    path = str(tmp_path / 'search.db')
+    activity_logger.SearchIndex(path).close()
+    db = sqlite3.connect(path)
+    db.execute("DROP INDEX events_identity")
+    db.execute("CREATE UNIQUE INDEX events_identity ON events(device, time, type)")
+    db.commit()
+    db.close()
+    index = activity_logger.SearchIndex(path)
+    index.add(clip('2024-01-01T10:00:00', 'alpha', 'a' * 64))
+    index.add(clip('2024-01-01T10:00:00', 'beta', 'b' * 64))
+    assert len(found(index, 'Copied')) == 2
+    index.close()
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import activity_logger
+
+DAYS = ('2024-01-01', '2024-01-02')
+
+
+def entry(time, event, device='A', event_type='window'):
+    return {'time': time, 'type': event_type, 'event': event, 'device': device}
+
+
+LOCAL = [
+    entry('2024-01-01T23:50:00', 'Switched to: Code'),
+    entry('2024-01-01T23:55:00', 'Switched to: Chrome'),
+    entry('2024-01-02T00:05:00', 'Status: User is Idle', event_type='activity'),
+    entry('2024-01-02T00:10:00', 'Status: User is Active', event_type='activity'),
+    entry('2024-01-02T02:00:00', 'Switched to: Code'),
+    entry('2024-01-02T02:10:00', 'Switched to: Slack'),
+]
+
+
+def merged(*streams):
+    return sorted((e for stream in streams for e in stream), key=lambda e: e['time'])
+
+
+def engine(tmp_path, name='state'):
+    classifier = activity_logger.AppClassifier(rules_file=str(tmp_path / 'no-rules.json'))
+    return activity_logger.SessionEngine(classifier, str(tmp_path / f'{name}.sessions.jsonl'), str(tmp_path / f'{name}.checkpoint.json'))
+
+
+def totals(engine):
+    return {(day, device): engine.day_totals(day, device) for day in DAYS for device in (None, 'A', 'B')}
+
+
+def fresh_totals(tmp_path, data):
+    fresh = engine(tmp_path, 'fresh')
+    fresh.load(data)
+    return totals(fresh)
+
+
+def test_resumed_engine_matches_a_fresh_build(tmp_path):
+    first = engine(tmp_path)
+    first.load(LOCAL[:4])
+    first.save()
+    resumed = engine(tmp_path)
+    fed = []
+    feed = resumed.feed
+    resumed.feed = lambda e: (fed.append(e), feed(e))
+    resumed.load(LOCAL)
+    assert fed == LOCAL[4:] # Only the events logged since the checkpoint are replayed
+    assert totals(resumed) == fresh_totals(tmp_path, LOCAL)
+
+
+def test_syncing_earlier_events_of_another_device(tmp_path):
+    engine(tmp_path).load(LOCAL)
+    other = [entry('2024-01-02T01:00:00', 'Switched to: Slack', 'B'), entry('2024-01-02T01:20:00', 'Switched to: Code', 'B')]
+    synced = merged(LOCAL, other)
+    resumed = engine(tmp_path)
+    resumed.load(synced)
+    assert resumed.processed['A'] == len(LOCAL)
+    assert totals(resumed) == fresh_totals(tmp_path, synced)
+    assert resumed.day_totals('2024-01-02', 'B')[0] > 0
+
+
+def test_sessions_file_cut_off_mid_line_is_rebuilt(tmp_path):
+    first = engine(tmp_path)
+    first.load(LOCAL)
+    sessions_file = tmp_path / 'state.sessions.jsonl'
+    content = sessions_file.read_bytes()
+    sessions_file.write_bytes(content[:len(content) - 10]) # A crash during the last append
+    resumed = engine(tmp_path)
+    resumed.load(LOCAL)
+    assert totals(resumed) == fresh_totals(tmp_path, LOCAL)
+    for line in sessions_file.read_text().splitlines():
+        json.loads(line)
+
+
+def test_damaged_checkpoint_is_rebuilt(tmp_path):
+    engine(tmp_path).load(LOCAL)
+    (tmp_path / 'state.checkpoint.json').write_text(json.dumps({'sessions': 1, 'streams': [['A', 'x']], 'open': [[1]]}))
+    resumed = engine(tmp_path)
+    resumed.load(LOCAL)
+    assert totals(resumed) == fresh_totals(tmp_path, LOCAL)